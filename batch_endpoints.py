@@ -3,19 +3,26 @@
 Endpoints para processamento em lote.
 Separado do main.py para melhor organização.
 """
+import io
+import csv
 import uuid
+import hashlib
 import json
 import logging
 from datetime import datetime, timedelta
-from typing import Annotated, List, Dict, Any
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from functools import lru_cache
+from typing import Annotated, List, Dict, Any, NamedTuple, Optional
+from fastapi import APIRouter, HTTPException, Depends, Response, status
+from sqlalchemy.orm import Session, load_only
+import orjson
+from sqlalchemy import func, insert, select, Text
 
 import models
 import models_batch
 import schemas_batch
-from database import SessionLocal
+from batch_utils import refresh_batch_stats, BATCH_TERMINAL_STATUSES
+from cache_utils import cache_get, cache_set
+from database import SessionScoped
 from fastapi.security import OAuth2PasswordBearer
 
 # OAuth2 scheme local
@@ -34,11 +41,11 @@ router = APIRouter(prefix="/batches", tags=["batches"])
 
 # Dependência para obter sessão do banco
 def get_db():
-    db = SessionLocal()
+    db = SessionScoped()
     try:
         yield db
     finally:
-        db.close()
+        SessionScoped.remove()
 
 # Carregar catálogo de vozes
 try:
@@ -48,20 +55,38 @@ except FileNotFoundError:
     logger.warning("tts_voices_catalog.json não encontrado, usando catálogo vazio")
     TTS_VOICES_CATALOG = {}
 
+# Derivados do catálogo (carregado uma vez): conjunto de vozes por idioma
+# para validação O(1) e total de vozes
+TTS_VOICE_SETS = {lang: frozenset(voices) for lang, voices in TTS_VOICES_CATALOG.items()}
+TTS_TOTAL_VOICES = sum(len(voices) for voices in TTS_VOICES_CATALOG.values())
+
 # ============================================================================
 # FUNÇÕES AUXILIARES
 # ============================================================================
 
 def validate_voice_for_language(language_code: str, voice_id: str) -> bool:
     """Valida se a voz existe para o idioma especificado."""
-    if language_code not in TTS_VOICES_CATALOG:
+    voices = TTS_VOICE_SETS.get(language_code)
+    if voices is None:
         return False
-    return voice_id in TTS_VOICES_CATALOG[language_code]
+    return voice_id in voices
 
 
-def estimate_job_cost(num_jobs: int) -> Dict[str, Any]:
+class JobCostEstimate(NamedTuple):
+    """Estimativa imutável de custo/tempo (compartilhada pelo cache)"""
+    total_jobs: int
+    estimated_cost_usd: float
+    estimated_time_minutes: int
+    cost_per_job: float
+    time_per_job: float
+    parallel_workers: int
+
+
+@lru_cache(maxsize=1024)
+def _estimate_job_cost(num_jobs: int) -> JobCostEstimate:
     """
-    Estima custo e tempo para processamento de jobs.
+    Estima custo e tempo para processamento de jobs (memoizado: o
+    domínio é pequeno, até o limite de jobs por batch).
     
     Custos estimados:
     - Gemini API: $0.002 por roteiro
@@ -81,14 +106,57 @@ def estimate_job_cost(num_jobs: int) -> Dict[str, Any]:
     parallel_factor = min(num_jobs, 10)
     estimated_time = (num_jobs / parallel_factor) * time_per_job
     
-    return {
-        "total_jobs": num_jobs,
-        "estimated_cost_usd": round(num_jobs * cost_per_job, 2),
-        "estimated_time_minutes": int(estimated_time),
-        "cost_per_job": cost_per_job,
-        "time_per_job": time_per_job,
-        "parallel_workers": parallel_factor
-    }
+    return JobCostEstimate(
+        total_jobs=num_jobs,
+        estimated_cost_usd=round(num_jobs * cost_per_job, 2),
+        estimated_time_minutes=int(estimated_time),
+        cost_per_job=cost_per_job,
+        time_per_job=time_per_job,
+        parallel_workers=parallel_factor
+    )
+
+
+def estimate_job_cost(num_jobs: int) -> Dict[str, Any]:
+    """Estimativa de custo/tempo como dict (cópia nova para a resposta da API)"""
+    return _estimate_job_cost(num_jobs)._asdict()
+
+
+# Colunas gravadas na criação dos jobs. O COPY ignora os defaults Python
+# do modelo, então os contadores vão explícitos; das demais só os
+# timestamps têm server_default, o resto fica NULL até o processamento
+BATCH_JOB_SEED_COLUMNS = (
+    "id", "batch_id", "owner_email", "agent_id", "title", "language_code",
+    "voice_id", "variation_number", "status", "cache_key",
+    "retry_count", "api_calls_count"
+)
+
+
+def copy_batch_jobs(db: Session, jobs: List[Dict[str, Any]]):
+    """
+    Insere as linhas de BatchJob com COPY FROM STDIN (Postgres/psycopg2),
+    bem mais rápido que INSERT para os milhares de jobs do modo matrix.
+    
+    Args:
+        db: Sessão do banco
+        jobs: Linhas com as chaves de BATCH_JOB_SEED_COLUMNS
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for job in jobs:
+        writer.writerow([job[column] for column in BATCH_JOB_SEED_COLUMNS])
+    buffer.seek(0)
+    
+    columns = ", ".join(BATCH_JOB_SEED_COLUMNS)
+    cursor = db.connection().connection.cursor()
+    try:
+        # Strings vão entre aspas; FORCE_NULL trata "" das colunas opcionais como NULL
+        cursor.copy_expert(
+            f"COPY batch_jobs ({columns}) FROM STDIN "
+            f"WITH (FORMAT csv, FORCE_NULL (agent_id, cache_key))",
+            buffer
+        )
+    finally:
+        cursor.close()
 
 
 def create_batch_jobs(
@@ -99,9 +167,10 @@ def create_batch_jobs(
     titles: List[str],
     language_voices: List[schemas_batch.LanguageVoiceConfig],
     num_variations: int = 1
-) -> List[models_batch.BatchJob]:
+) -> List[Dict[str, Any]]:
     """
-    Cria jobs individuais para um batch.
+    Cria jobs individuais para um batch em uma única carga (COPY no
+    Postgres, INSERT executemany nos demais bancos).
     
     Args:
         db: Sessão do banco
@@ -113,7 +182,7 @@ def create_batch_jobs(
         num_variations: Número de variações por título
     
     Returns:
-        Lista de BatchJob criados
+        Lista das linhas de BatchJob inseridas
     """
     jobs = []
     
@@ -122,27 +191,32 @@ def create_batch_jobs(
             for variation_num in range(1, num_variations + 1):
                 job_id = str(uuid.uuid4())
                 
-                # Criar cache key
-                import hashlib
+                # Criar cache key (chave de reutilização, não de segurança:
+                # blake2b de 256 bits, 64 caracteres hex como antes)
                 cache_data = f"{title}|{agent_id}|{lang_voice.code}|{lang_voice.voice}|{variation_num}"
-                cache_key = hashlib.sha256(cache_data.encode()).hexdigest()
+                cache_key = hashlib.blake2b(cache_data.encode(), digest_size=32).hexdigest()
                 
-                job = models_batch.BatchJob(
-                    id=job_id,
-                    batch_id=batch_id,
-                    owner_email=owner_email,
-                    agent_id=agent_id,
-                    title=title,
-                    language_code=lang_voice.code,
-                    voice_id=lang_voice.voice,
-                    variation_number=variation_num,
-                    status="queued",
-                    cache_key=cache_key
-                )
-                
-                db.add(job)
-                jobs.append(job)
+                jobs.append({
+                    "id": job_id,
+                    "batch_id": batch_id,
+                    "owner_email": owner_email,
+                    "agent_id": agent_id,
+                    "title": title,
+                    "language_code": lang_voice.code,
+                    "voice_id": lang_voice.voice,
+                    "variation_number": variation_num,
+                    "status": "queued",
+                    "cache_key": cache_key,
+                    "retry_count": 0,
+                    "api_calls_count": 0
+                })
     
+    if jobs:
+        if db.get_bind().dialect.driver == "psycopg2":
+            copy_batch_jobs(db, jobs)
+        else:
+            # INSERT Core com lista de linhas em vez de um add() por job
+            db.execute(insert(models_batch.BatchJob.__table__), jobs)
     db.commit()
     return jobs
 
@@ -152,7 +226,7 @@ def create_batch_jobs(
 # ============================================================================
 
 @router.post("/create", response_model=schemas_batch.BatchCreationResponse)
-async def create_batch(
+def create_batch(
     request: schemas_batch.BatchCreateRequest,
     current_user: Annotated[models.User, Depends(get_current_user)],
     db: Session = Depends(get_db)
@@ -275,8 +349,92 @@ async def create_batch(
         raise HTTPException(status_code=500, detail=f"Erro ao criar batch: {str(e)}")
 
 
+# Respostas de status/resultados em cache: curtas enquanto o batch roda,
+# longas (padrão do cache_set) quando ele termina
+BATCH_CACHE_RUNNING_TTL_SECONDS = 5
+
+
+# As respostas abaixo são devolvidas já serializadas (Response com o corpo
+# JSON pronto): sem a revalidação do response_model para centenas de jobs,
+# e o mesmo corpo vai para o cache
+
+def json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+
+def get_cached_batch_response(cache_key: str, owner_email: str) -> Optional[Response]:
+    """Resposta de batch em cache, só se pertencer ao usuário"""
+    cached = cache_get(cache_key)
+    if cached and cached["owner_email"] == owner_email:
+        return json_response(cached["body"].encode())
+    return None
+
+
+def cache_batch_response(cache_key: str, batch_status: str, owner_email: str, body: bytes) -> Response:
+    """Guarda o corpo serializado, com TTL conforme o estado do batch"""
+    value = {"owner_email": owner_email, "body": body.decode()}
+    if batch_status in BATCH_TERMINAL_STATUSES:
+        cache_set(cache_key, value)
+    else:
+        cache_set(cache_key, value, ttl=BATCH_CACHE_RUNNING_TTL_SECONDS)
+    return json_response(body)
+
+
+# Colunas de BatchJob lidas pelos endpoints de status e de resultados
+BATCH_JOB_INFO_COLUMNS = (
+    models_batch.BatchJob.id,
+    models_batch.BatchJob.title,
+    models_batch.BatchJob.language_code,
+    models_batch.BatchJob.voice_id,
+    models_batch.BatchJob.status,
+    models_batch.BatchJob.roteiro_url,
+    models_batch.BatchJob.audio_url,
+    models_batch.BatchJob.error_message,
+    models_batch.BatchJob.processing_time_seconds,
+    models_batch.BatchJob.created_at,
+    models_batch.BatchJob.completed_at,
+)
+BATCH_JOB_RESULT_FIELDS = (
+    ("job_id", models_batch.BatchJob.id),
+    ("title", models_batch.BatchJob.title),
+    ("language", models_batch.BatchJob.language_code),
+    ("voice", models_batch.BatchJob.voice_id),
+    ("roteiro_url", models_batch.BatchJob.roteiro_url),
+    ("audio_url", models_batch.BatchJob.audio_url),
+    ("duration_seconds", models_batch.BatchJob.audio_duration_seconds),
+    ("char_count", models_batch.BatchJob.roteiro_char_count),
+)
+
+
+def completed_results_json(db: Session, batch_id: str) -> bytes:
+    """
+    Array JSON dos resultados dos jobs completados do batch. No Postgres
+    o array é montado pelo banco (json_agg) e chega como um único texto;
+    nos demais bancos, a partir das colunas selecionadas.
+    """
+    where = (
+        models_batch.BatchJob.batch_id == batch_id,
+        models_batch.BatchJob.status == "completed"
+    )
+    
+    if db.get_bind().dialect.name == "postgresql":
+        row_object = func.json_build_object(
+            *[part for field in BATCH_JOB_RESULT_FIELDS for part in field]
+        )
+        results = db.execute(
+            select(func.coalesce(func.json_agg(row_object).cast(Text), "[]")).where(*where)
+        ).scalar()
+        return results.encode()
+    
+    keys = tuple(key for key, _ in BATCH_JOB_RESULT_FIELDS)
+    rows = db.execute(
+        select(*[column for _, column in BATCH_JOB_RESULT_FIELDS]).where(*where)
+    ).all()
+    return orjson.dumps([dict(zip(keys, row)) for row in rows])
+
+
 @router.get("/{batch_id}/status", response_model=schemas_batch.BatchStatusResponse)
-async def get_batch_status(
+def get_batch_status(
     batch_id: str,
     current_user: Annotated[models.User, Depends(get_current_user)],
     db: Session = Depends(get_db),
@@ -289,6 +447,11 @@ async def get_batch_status(
         batch_id: ID do batch
         include_jobs: Se True, inclui lista de jobs individuais
     """
+    cache_key = f"batch:status:{batch_id}:{int(include_jobs)}"
+    cached = get_cached_batch_response(cache_key, current_user.email)
+    if cached is not None:
+        return cached
+    
     batch = db.query(models_batch.Batch).filter(
         models_batch.Batch.id == batch_id
     ).first()
@@ -299,42 +462,22 @@ async def get_batch_status(
     if batch.owner_email != current_user.email:
         raise HTTPException(status_code=403, detail="Não autorizado")
     
-    # Atualizar estatísticas
-    jobs_stats = db.query(
-        models_batch.BatchJob.status,
-        func.count(models_batch.BatchJob.id)
-    ).filter(
-        models_batch.BatchJob.batch_id == batch_id
-    ).group_by(models_batch.BatchJob.status).all()
-    
-    stats = {status: count for status, count in jobs_stats}
-    
-    batch.completed_jobs = stats.get("completed", 0)
-    batch.failed_jobs = stats.get("failed", 0)
-    batch.running_jobs = stats.get("running", 0)
-    batch.progress_percentage = (batch.completed_jobs / batch.total_jobs * 100) if batch.total_jobs > 0 else 0
-    
-    # Atualizar status do batch
-    if batch.completed_jobs + batch.failed_jobs == batch.total_jobs:
-        batch.status = "completed" if batch.failed_jobs == 0 else "failed"
-        if not batch.completed_at:
-            batch.completed_at = datetime.utcnow()
-    elif batch.running_jobs > 0:
-        batch.status = "processing"
-        if not batch.started_at:
-            batch.started_at = datetime.utcnow()
-    
-    db.commit()
+    # Atualizar estatísticas (agregação + UPDATE único; o batch expirado
+    # no commit é relido com os valores novos)
+    refresh_batch_stats(db, batch_id)
     
     # Buscar jobs se solicitado
     jobs_info = []
     if include_jobs:
-        jobs = db.query(models_batch.BatchJob).filter(
+        # Só as colunas de BatchJobInfo (o roteiro inline não sai do banco)
+        jobs = db.query(models_batch.BatchJob).options(
+            load_only(*BATCH_JOB_INFO_COLUMNS)
+        ).filter(
             models_batch.BatchJob.batch_id == batch_id
         ).limit(100).all()  # Limitar a 100 para performance
         
         jobs_info = [
-            schemas_batch.BatchJobInfo(
+            schemas_batch.BatchJobInfo.model_construct(
                 job_id=job.id,
                 title=job.title,
                 language_code=job.language_code,
@@ -350,7 +493,7 @@ async def get_batch_status(
             for job in jobs
         ]
     
-    return schemas_batch.BatchStatusResponse(
+    response = schemas_batch.BatchStatusResponse.model_construct(
         batch_id=batch.id,
         mode=batch.mode,
         status=batch.status,
@@ -365,10 +508,12 @@ async def get_batch_status(
         completed_at=batch.completed_at,
         jobs=jobs_info
     )
+    body = response.model_dump_json().encode()
+    return cache_batch_response(cache_key, batch.status, batch.owner_email, body)
 
 
 @router.get("/{batch_id}/results", response_model=schemas_batch.BatchResultsResponse)
-async def get_batch_results(
+def get_batch_results(
     batch_id: str,
     current_user: Annotated[models.User, Depends(get_current_user)],
     db: Session = Depends(get_db)
@@ -377,6 +522,11 @@ async def get_batch_results(
     Retorna os resultados completos de um batch.
     Apenas disponível quando o batch está completo.
     """
+    cache_key = f"batch:results:{batch_id}"
+    cached = get_cached_batch_response(cache_key, current_user.email)
+    if cached is not None:
+        return cached
+    
     batch = db.query(models_batch.Batch).filter(
         models_batch.Batch.id == batch_id
     ).first()
@@ -387,42 +537,43 @@ async def get_batch_results(
     if batch.owner_email != current_user.email:
         raise HTTPException(status_code=403, detail="Não autorizado")
     
-    if batch.status not in ["completed", "failed"]:
+    if batch.status not in BATCH_TERMINAL_STATUSES:
         raise HTTPException(status_code=400, detail="Batch ainda em processamento")
     
-    # Buscar todos os jobs completados
-    jobs = db.query(models_batch.BatchJob).filter(
-        models_batch.BatchJob.batch_id == batch_id,
-        models_batch.BatchJob.status == "completed"
-    ).all()
-    
-    results = [
-        {
-            "job_id": job.id,
-            "title": job.title,
-            "language": job.language_code,
-            "voice": job.voice_id,
-            "roteiro_url": job.roteiro_url,
-            "audio_url": job.audio_url,
-            "duration_seconds": job.audio_duration_seconds,
-            "char_count": job.roteiro_char_count
-        }
-        for job in jobs
-    ]
-    
-    return schemas_batch.BatchResultsResponse(
-        batch_id=batch.id,
-        status=batch.status,
-        total_jobs=batch.total_jobs,
-        completed_jobs=batch.completed_jobs,
-        failed_jobs=batch.failed_jobs,
-        results=results,
-        metadata=batch.metadata_config or {}
-    )
+    # Cabeçalho serializado aqui e o array de resultados (o campo grande)
+    # já pronto em JSON, encaixado no corpo sem passar por dicts/Pydantic
+    header = orjson.dumps({
+        "batch_id": batch.id,
+        "status": batch.status,
+        "total_jobs": batch.total_jobs,
+        "completed_jobs": batch.completed_jobs,
+        "failed_jobs": batch.failed_jobs,
+        "metadata": batch.metadata_config or {}
+    })
+    body = header[:-1] + b',"results":' + completed_results_json(db, batch_id) + b'}'
+    return cache_batch_response(cache_key, batch.status, batch.owner_email, body)
+
+
+# Chaves de cada batch na listagem e as colunas correspondentes
+_BATCH_LIST_KEYS = (
+    "batch_id", "mode", "status", "total_jobs", "completed_jobs",
+    "failed_jobs", "progress_percentage", "created_at", "completed_at"
+)
+_BATCH_LIST_COLUMNS = (
+    models_batch.Batch.id,
+    models_batch.Batch.mode,
+    models_batch.Batch.status,
+    models_batch.Batch.total_jobs,
+    models_batch.Batch.completed_jobs,
+    models_batch.Batch.failed_jobs,
+    models_batch.Batch.progress_percentage,
+    models_batch.Batch.created_at,
+    models_batch.Batch.completed_at,
+)
 
 
 @router.get("/list", response_model=schemas_batch.BatchListResponse)
-async def list_user_batches(
+def list_user_batches(
     current_user: Annotated[models.User, Depends(get_current_user)],
     db: Session = Depends(get_db),
     limit: int = 50,
@@ -431,7 +582,9 @@ async def list_user_batches(
     """
     Lista todos os batches do usuário.
     """
-    batches = db.query(models_batch.Batch).filter(
+    # Só as colunas da listagem (sem metadata_config); cada linha vira o
+    # dicionário da resposta direto pela tupla de chaves
+    rows = db.query(*_BATCH_LIST_COLUMNS).filter(
         models_batch.Batch.owner_email == current_user.email
     ).order_by(models_batch.Batch.created_at.desc()).limit(limit).offset(offset).all()
     
@@ -439,24 +592,9 @@ async def list_user_batches(
         models_batch.Batch.owner_email == current_user.email
     ).scalar()
     
-    batches_data = [
-        {
-            "batch_id": b.id,
-            "mode": b.mode,
-            "status": b.status,
-            "total_jobs": b.total_jobs,
-            "completed_jobs": b.completed_jobs,
-            "failed_jobs": b.failed_jobs,
-            "progress_percentage": b.progress_percentage,
-            "created_at": b.created_at.isoformat(),
-            "completed_at": b.completed_at.isoformat() if b.completed_at else None
-        }
-        for b in batches
-    ]
-    
-    return schemas_batch.BatchListResponse(
+    return schemas_batch.BatchListResponse.model_construct(
         total=total,
-        batches=batches_data
+        batches=[dict(zip(_BATCH_LIST_KEYS, row)) for row in rows]
     )
 
 
@@ -465,10 +603,8 @@ async def list_available_voices():
     """
     Lista todas as vozes disponíveis por idioma.
     """
-    total_voices = sum(len(voices) for voices in TTS_VOICES_CATALOG.values())
-    
     return schemas_batch.VoicesResponse(
-        total_voices=total_voices,
+        total_voices=TTS_TOTAL_VOICES,
         voices_by_language=TTS_VOICES_CATALOG
     )
 
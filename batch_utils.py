@@ -0,0 +1,87 @@
+# batch_utils.py
+"""
+Utilitários compartilhados de batches: recálculo das estatísticas do
+batch a partir dos jobs (usado pelo endpoint de status e pelos workers)
+e invalidação das respostas de batch em cache.
+"""
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy import and_, case, func, select, update
+from sqlalchemy.orm import Session
+
+import models_batch
+from cache_utils import cache_delete
+
+# Estados finais de um batch (respostas não mudam mais sem nova atualização)
+BATCH_TERMINAL_STATUSES = ("completed", "failed")
+
+
+def invalidate_batch_cache(batch_id: str):
+    """Remove as respostas de status/resultados do batch em cache"""
+    for key in (
+        f"batch:status:{batch_id}:0",
+        f"batch:status:{batch_id}:1",
+        f"batch:results:{batch_id}",
+    ):
+        cache_delete(key)
+
+
+def refresh_batch_stats(db: Session, batch_id: str) -> Dict[str, int]:
+    """
+    Recalcula contadores, progresso e status do batch com uma agregação
+    sobre batch_jobs e um único UPDATE em batches (sem carregar a linha).
+
+    Args:
+        db: Sessão do banco
+        batch_id: ID do batch
+
+    Returns:
+        Contagens {"completed", "failed", "running"} usadas no UPDATE
+    """
+    Batch = models_batch.Batch
+    BatchJob = models_batch.BatchJob
+
+    completed, failed, running = db.execute(
+        select(
+            func.count(case((BatchJob.status == "completed", 1))),
+            func.count(case((BatchJob.status == "failed", 1))),
+            func.count(case((BatchJob.status == "running", 1)))
+        ).where(BatchJob.batch_id == batch_id)
+    ).one()
+
+    now = datetime.utcnow()
+    finished = Batch.total_jobs == completed + failed
+    values = {
+        "completed_jobs": completed,
+        "failed_jobs": failed,
+        "running_jobs": running,
+        "progress_percentage": case(
+            (Batch.total_jobs > 0, completed * 100.0 / Batch.total_jobs),
+            else_=0.0
+        ),
+        "status": case(
+            (finished, "completed" if failed == 0 else "failed"),
+            else_="processing" if running > 0 else Batch.status
+        ),
+        "completed_at": case(
+            (and_(finished, Batch.completed_at.is_(None)), now),
+            else_=Batch.completed_at
+        ),
+    }
+    if running > 0:
+        values["started_at"] = case(
+            (and_(~finished, Batch.started_at.is_(None)), now),
+            else_=Batch.started_at
+        )
+
+    db.execute(
+        update(Batch)
+        .where(Batch.id == batch_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    invalidate_batch_cache(batch_id)
+
+    return {"completed": completed, "failed": failed, "running": running}
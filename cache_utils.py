@@ -3,12 +3,18 @@
 Utilitários para cache e rate limiting.
 """
 import os
+import math
+import time
+import operator
+import threading
 import redis
+import asyncio
 import hashlib
 import json
 import logging
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Awaitable
 from functools import wraps
 
 logger = logging.getLogger(__name__)
@@ -49,7 +55,8 @@ def generate_cache_key(prefix: str, **kwargs) -> str:
     # Ordenar kwargs para garantir consistência
     sorted_params = sorted(kwargs.items())
     data = json.dumps(sorted_params, sort_keys=True)
-    hash_value = hashlib.sha256(data.encode()).hexdigest()
+    # Chave de cache, não de segurança: blake2b de 128 bits é mais rápido
+    hash_value = hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
     return f"{prefix}:{hash_value}"
 
 
@@ -70,9 +77,9 @@ def cache_get(key: str) -> Optional[Any]:
     try:
         value = client.get(key)
         if value:
-            logger.info(f"Cache HIT: {key}")
+            logger.info("Cache HIT: %s", key)
             return json.loads(value)
-        logger.info(f"Cache MISS: {key}")
+        logger.info("Cache MISS: %s", key)
         return None
     except Exception as e:
         logger.error(f"Erro ao buscar cache: {e}")
@@ -95,7 +102,7 @@ def cache_set(key: str, value: Any, ttl: int = 2592000):
     try:
         serialized = json.dumps(value)
         client.setex(key, ttl, serialized)
-        logger.info(f"Cache SET: {key} (TTL: {ttl}s)")
+        logger.info("Cache SET: %s (TTL: %ss)", key, ttl)
     except Exception as e:
         logger.error(f"Erro ao salvar cache: {e}")
 
@@ -113,7 +120,7 @@ def cache_delete(key: str):
     
     try:
         client.delete(key)
-        logger.info(f"Cache DELETE: {key}")
+        logger.info("Cache DELETE: %s", key)
     except Exception as e:
         logger.error(f"Erro ao deletar cache: {e}")
 
@@ -188,7 +195,7 @@ class RateLimiter:
                 client.expire(key, self.window_seconds)
                 return True
             else:
-                logger.warning(f"Rate limit excedido para {identifier}")
+                logger.warning("Rate limit excedido para %s", identifier)
                 return False
                 
         except Exception as e:
@@ -389,22 +396,26 @@ api_circuit_breaker = CircuitBreaker(failure_threshold=5, timeout_seconds=60)
 # ESTATÍSTICAS
 # ============================================================================
 
-def increment_counter(key: str, amount: int = 1):
+def increment_counter(key: str, amount: int = 1) -> Optional[int]:
     """
     Incrementa contador no Redis.
     
     Args:
         key: Chave do contador
         amount: Valor a incrementar
+    
+    Returns:
+        Novo valor do contador ou None se o Redis não estiver disponível
     """
     client = get_redis_client()
     if not client:
-        return
+        return None
     
     try:
-        client.incrby(key, amount)
+        return client.incrby(key, amount)
     except Exception as e:
         logger.error(f"Erro ao incrementar contador: {e}")
+        return None
 
 
 def get_counter(key: str) -> int:
@@ -427,3 +438,268 @@ def get_counter(key: str) -> int:
     except Exception as e:
         logger.error(f"Erro ao obter contador: {e}")
         return 0
+
+
+# ============================================================================
+# CACHE SEMÂNTICO
+# ============================================================================
+
+class SemanticCache:
+    """
+    Cache em memória por similaridade de embeddings (estilo GenCache).
+    Títulos parafraseados ("O poder do silêncio" vs "O poder do silêncio
+    na vida") reaproveitam o mesmo roteiro quando a similaridade de
+    cosseno passa do threshold e o agente é o mesmo.
+    
+    A busca é linear (O(n·d)) sobre as entradas do agente: manter
+    max_entries pequeno e chamar lookup via asyncio.to_thread em código
+    assíncrono. Thread-safe.
+    """
+    
+    def __init__(self, threshold: float = 0.92, max_entries: int = 1000):
+        """
+        Args:
+            threshold: Similaridade mínima de cosseno para considerar HIT
+            max_entries: Número máximo de entradas (FIFO ao estourar)
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # agent_hash -> deque[(vetor_normalizado, valor)]; a busca só
+        # percorre as entradas do próprio agente
+        self._by_agent: Dict[str, deque] = {}
+        self._order = deque()  # agent_hash de cada entrada, da mais antiga
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _normalize(vector) -> tuple:
+        norm = math.sqrt(sum(x * x for x in vector))
+        if norm == 0:
+            return tuple(vector)
+        return tuple(x / norm for x in vector)
+    
+    def lookup(self, vector, agent_hash: str) -> Optional[Any]:
+        """
+        Busca o valor mais similar para o agente informado.
+        
+        Args:
+            vector: Embedding da consulta
+            agent_hash: Hash da configuração do agente
+        
+        Returns:
+            Valor em cache ou None se nenhum acima do threshold
+        """
+        query = self._normalize(vector)
+        best_score = -1.0
+        best_value = None
+        
+        # Cópia rasa sob o lock; o produto escalar roda fora dele
+        with self._lock:
+            entries = list(self._by_agent.get(agent_hash, ()))
+        
+        for entry_vector, value in entries:
+            score = sum(map(operator.mul, query, entry_vector))
+            if score > best_score:
+                best_score = score
+                best_value = value
+        
+        if best_value is not None and best_score >= self.threshold:
+            logger.info("Cache semântico HIT (score: %.3f)", best_score)
+            return best_value
+        
+        logger.info("Cache semântico MISS")
+        return None
+    
+    def add(self, vector, agent_hash: str, value: Any):
+        """
+        Adiciona uma entrada ao cache.
+        
+        Args:
+            vector: Embedding da chave
+            agent_hash: Hash da configuração do agente
+            value: Valor a ser salvo
+        """
+        entry = (self._normalize(vector), value)
+        with self._lock:
+            if len(self._order) >= self.max_entries:
+                # FIFO global: a mais antiga é a primeira do seu agente
+                oldest_agent = self._order.popleft()
+                oldest_entries = self._by_agent[oldest_agent]
+                oldest_entries.popleft()
+                if not oldest_entries:
+                    del self._by_agent[oldest_agent]
+            self._by_agent.setdefault(agent_hash, deque()).append(entry)
+            self._order.append(agent_hash)
+    
+    def clear(self):
+        """Remove todas as entradas."""
+        with self._lock:
+            self._by_agent.clear()
+            self._order.clear()
+
+
+# ============================================================================
+# SINGLE-FLIGHT
+# ============================================================================
+
+class SingleFlight:
+    """
+    Coalesce chamadas concorrentes idênticas: enquanto a primeira chamada
+    de uma chave está em andamento, as demais aguardam o mesmo resultado
+    em vez de repetir o trabalho.
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+    
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Executa func() uma única vez por chave em andamento.
+        
+        Args:
+            key: Chave que identifica chamadas equivalentes
+            func: Corrotina (sem argumentos) que faz o trabalho real
+        
+        Returns:
+            Resultado de func(), compartilhado entre chamadas concorrentes
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            logger.info("Single-flight: aguardando chamada em andamento (%s)", key)
+            return await asyncio.shield(future)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            # Só a chamada líder foi cancelada: os que aguardam recebem um
+            # erro comum (tratado como falha do job), não um CancelledError
+            future.set_exception(RuntimeError(f"Chamada single-flight cancelada ({key})"))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Evita aviso de exceção não recuperada
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+
+# ============================================================================
+# CACHE DE ARQUIVOS (CONTENT-ADDRESSED)
+# ============================================================================
+
+class FileCache:
+    """
+    Cache em disco endereçado por conteúdo. Um HIT cria um hard link do
+    arquivo em cache no destino, sem ler os bytes. Métodos síncronos:
+    chamar via asyncio.to_thread em código assíncrono.
+    """
+    
+    def __init__(
+        self,
+        directory: str,
+        max_files: int = 2000,
+        suffix: str = "",
+        max_age_seconds: Optional[float] = None
+    ):
+        """
+        Args:
+            directory: Diretório do cache
+            max_files: Número máximo de arquivos (remove os menos usados)
+            suffix: Extensão dos arquivos em cache (ex: ".mp3")
+            max_age_seconds: Remove entradas sem uso há mais que isso
+        """
+        self.directory = directory
+        self.max_files = max_files
+        self.suffix = suffix
+        self.max_age_seconds = max_age_seconds
+        os.makedirs(directory, exist_ok=True)
+    
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Gera a chave de conteúdo (blake2b de 128 bits)."""
+        return hashlib.blake2b("|".join(parts).encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+    
+    @staticmethod
+    def _write(path: str, data: bytes):
+        # os.open/os.write direto, sem a camada de arquivo bufferizado
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+    
+    @classmethod
+    def _link(cls, source: str, dest: str):
+        if os.path.exists(dest):
+            os.remove(dest)
+        try:
+            os.link(source, dest)
+        except OSError:
+            # Sistemas de arquivos diferentes ou sem suporte a hard link
+            with open(source, "rb") as src:
+                cls._write(dest, src.read())
+    
+    def get(self, key: str, dest: str) -> bool:
+        """
+        Materializa a entrada em dest se existir.
+        
+        Returns:
+            True em caso de HIT
+        """
+        path = self._path(key)
+        try:
+            self._link(path, dest)
+        except FileNotFoundError:
+            return False
+        os.utime(path)  # Marca como usado recentemente
+        logger.info("Cache de arquivo HIT: %s", key)
+        return True
+    
+    def put(self, key: str, data: bytes, dest: str):
+        """
+        Grava a entrada no cache e materializa em dest.
+        
+        Args:
+            key: Chave de conteúdo
+            data: Bytes do arquivo
+            dest: Caminho final do arquivo
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{os.urandom(4).hex()}.tmp"
+        self._write(tmp_path, data)
+        os.replace(tmp_path, path)
+        self._link(path, dest)
+        self._evict()
+    
+    def _evict(self):
+        entries = [
+            entry for entry in os.scandir(self.directory)
+            if entry.is_file() and entry.name.endswith(self.suffix)
+        ]
+        if self.max_age_seconds is None and len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        
+        # Sem uso há mais de max_age_seconds (o mtime é renovado a cada HIT)
+        expired = 0
+        if self.max_age_seconds is not None:
+            cutoff = time.time() - self.max_age_seconds
+            while expired < len(entries) and entries[expired].stat().st_mtime < cutoff:
+                expired += 1
+        
+        excess = max(expired, len(entries) - self.max_files)
+        for entry in entries[:excess]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
@@ -66,6 +66,7 @@ celery_app.conf.update(
     task_routes={
         'celery_tasks.process_job_task': {'queue': 'bolt_ia_default'},
         'celery_tasks.process_batch_task': {'queue': 'bolt_ia_high_priority'},
+        'celery_tasks.generate_jobs_task': {'queue': 'bolt_ia_default'},
     },
     
     # Monitoramento
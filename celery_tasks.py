@@ -10,16 +10,25 @@ import logging
 from datetime import datetime
 from typing import Dict, Any, Optional
 from celery import Task
+from sqlalchemy import update
+from sqlalchemy.orm import load_only
 
 from celery_app import celery_app
 from database import SessionLocal
 import models_batch
 import models
+from tts_utils import split_text_into_chunks, run_tts, mp3_duration, audio_duration_seconds
+from batch_utils import refresh_batch_stats
+from cache_utils import increment_counter
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Com Redis, o uso de cada key é contado lá e repassado ao pool no banco
+# (total_requests/last_used_at) a cada N requisições
+API_KEY_USAGE_SYNC_EVERY = 50
+
 # ============================================================================
 # FUNÇÕES AUXILIARES
 # ============================================================================
@@ -37,18 +46,42 @@ def get_api_key_round_robin(db, service: str = "gemini") -> Optional[str]:
     """
     now = datetime.utcnow()
     
+    # Vez do round-robin compartilhada entre os workers no Redis; sem
+    # Redis, cai na key menos usada recentemente registrada no banco
+    turn = increment_counter(f"apikey:rr:{service}")
+    
     # Buscar keys ativas (circuit breaker fechado)
     keys = db.query(models_batch.ApiKeyPool).filter(
         models_batch.ApiKeyPool.service == service,
         models_batch.ApiKeyPool.is_active == 1,
         (models_batch.ApiKeyPool.circuit_open_until == None) | 
         (models_batch.ApiKeyPool.circuit_open_until < now)
-    ).order_by(models_batch.ApiKeyPool.last_used_at.asc()).all()
+    ).order_by(
+        models_batch.ApiKeyPool.id if turn is not None
+        else models_batch.ApiKeyPool.last_used_at.asc()
+    ).all()
     
     if not keys:
         logger.warning(f"Nenhuma API key disponível para {service}")
         return None
     
+    if turn is not None:
+        # Contadores de uso no Redis: só um UPDATE a cada
+        # API_KEY_USAGE_SYNC_EVERY requisições da key, não um por chamada
+        selected_key = keys[turn % len(keys)]
+        requests = increment_counter(f"apikey:{selected_key.id}:requests")
+        if requests is not None and requests % API_KEY_USAGE_SYNC_EVERY == 0:
+            db.execute(
+                update(models_batch.ApiKeyPool)
+                .where(models_batch.ApiKeyPool.id == selected_key.id)
+                .values(
+                    last_used_at=now,
+                    total_requests=models_batch.ApiKeyPool.total_requests + API_KEY_USAGE_SYNC_EVERY
+                )
+            )
+            db.commit()
+        return selected_key.api_key
+    
     # Selecionar a menos usada recentemente
     selected_key = keys[0]
     
@@ -67,7 +100,7 @@ def emit_log(db, job_id: str, message: str, level: str = "info"):
     """
     timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
     log_entry = f"[{timestamp}] [{level.upper()}] {message}"
-    logger.info(f"[JOB {job_id}] {message}")
+    logger.info("[JOB %s] %s", job_id, message)
     
     # TODO: Adicionar campo de logs no modelo BatchJob se necessário
     # job = db.query(models_batch.BatchJob).filter(models_batch.BatchJob.id == job_id).first()
@@ -91,7 +124,7 @@ async def generate_roteiro_gemini(title: str, agent_prompts: Dict[str, str], api
         Texto do roteiro gerado
     """
     # Simulação (em produção, usar a API real)
-    logger.info(f"Gerando roteiro para: {title}")
+    logger.info("Gerando roteiro para: %s", title)
     await asyncio.sleep(2)  # Simula tempo de API
     
     # TODO: Implementar chamada real à API Gemini
@@ -116,7 +149,7 @@ async def adapt_roteiro_culturally(roteiro: str, language_code: str, api_key: st
     Returns:
         Roteiro adaptado
     """
-    logger.info(f"Adaptando roteiro para: {language_code}")
+    logger.info("Adaptando roteiro para: %s", language_code)
     await asyncio.sleep(1)  # Simula tempo de API
     
     # TODO: Implementar adaptação real
@@ -136,28 +169,32 @@ async def generate_tts_audio(text: str, language_code: str, voice_id: str, api_k
     Returns:
         Bytes do arquivo de áudio MP3
     """
-    logger.info(f"Gerando TTS: {voice_id}")
-    await asyncio.sleep(1.5)  # Simula tempo de API
-    
-    # TODO: Implementar TTS real
-    # from google.cloud import texttospeech
-    # client = texttospeech.TextToSpeechClient()
-    # synthesis_input = texttospeech.SynthesisInput(text=text)
-    # voice = texttospeech.VoiceSelectionParams(
-    #     language_code=language_code,
-    #     name=voice_id
-    # )
-    # audio_config = texttospeech.AudioConfig(
-    #     audio_encoding=texttospeech.AudioEncoding.MP3
-    # )
-    # response = client.synthesize_speech(
-    #     input=synthesis_input,
-    #     voice=voice,
-    #     audio_config=audio_config
-    # )
-    # return response.audio_content
+    logger.info("Gerando TTS: %s", voice_id)
     
-    return b"fake_audio_data"
+    async def synth(chunk: str) -> bytes:
+        await asyncio.sleep(1.5)  # Simula tempo de API
+        
+        # TODO: Implementar TTS real
+        # from google.cloud import texttospeech
+        # client = texttospeech.TextToSpeechClient()
+        # voice = texttospeech.VoiceSelectionParams(
+        #     language_code=language_code,
+        #     name=voice_id
+        # )
+        # audio_config = texttospeech.AudioConfig(
+        #     audio_encoding=texttospeech.AudioEncoding.MP3
+        # )
+        # response = await asyncio.to_thread(
+        #     client.synthesize_speech,
+        #     input=texttospeech.SynthesisInput(text=chunk),
+        #     voice=voice,
+        #     audio_config=audio_config
+        # )
+        # return response.audio_content
+        
+        return b"fake_audio_data"
+    
+    return await run_tts(split_text_into_chunks(text), synth)
 
 
 async def upload_to_s3(content: bytes, key: str, content_type: str = "application/octet-stream") -> str:
@@ -172,7 +209,7 @@ async def upload_to_s3(content: bytes, key: str, content_type: str = "applicatio
     Returns:
         URL pública do arquivo
     """
-    logger.info(f"Uploading to S3: {key}")
+    logger.info("Uploading to S3: %s", key)
     await asyncio.sleep(0.5)  # Simula tempo de upload
     
     # TODO: Implementar upload real para S3
@@ -199,10 +236,16 @@ def check_cache(db, cache_key: str) -> Optional[Dict[str, Any]]:
         cache_key: Chave do cache
     
     Returns:
-        Dicionário com roteiro_url e audio_url ou None
+        Dicionário com roteiro_url, audio_url e roteiro_char_count ou None
     """
     # Buscar job anterior com mesma cache_key
-    cached_job = db.query(models_batch.BatchJob).filter(
+    cached_job = db.query(models_batch.BatchJob).options(
+        load_only(
+            models_batch.BatchJob.roteiro_url,
+            models_batch.BatchJob.audio_url,
+            models_batch.BatchJob.roteiro_char_count
+        )
+    ).filter(
         models_batch.BatchJob.cache_key == cache_key,
         models_batch.BatchJob.status == "completed",
         models_batch.BatchJob.roteiro_url != None,
@@ -210,14 +253,14 @@ def check_cache(db, cache_key: str) -> Optional[Dict[str, Any]]:
     ).first()
     
     if cached_job:
-        logger.info(f"Cache HIT para key: {cache_key}")
+        logger.info("Cache HIT para key: %s", cache_key)
         return {
             "roteiro_url": cached_job.roteiro_url,
             "audio_url": cached_job.audio_url,
-            "roteiro_text": cached_job.roteiro_text
+            "roteiro_char_count": cached_job.roteiro_char_count
         }
     
-    logger.info(f"Cache MISS para key: {cache_key}")
+    logger.info("Cache MISS para key: %s", cache_key)
     return None
 
 
@@ -277,7 +320,7 @@ def process_job_task(self, job_id: str):
             emit_log(db, job_id, "Resultado encontrado em cache!")
             job.roteiro_url = cached_result["roteiro_url"]
             job.audio_url = cached_result["audio_url"]
-            job.roteiro_text = cached_result.get("roteiro_text")
+            job.roteiro_char_count = cached_result["roteiro_char_count"]
             job.status = "completed"
             job.completed_at = datetime.utcnow()
             job.processing_time_seconds = int(time.time() - start_time)
@@ -312,7 +355,6 @@ def process_job_task(self, job_id: str):
         )
         
         # Atualizar job com resultados
-        job.roteiro_text = result["roteiro_text"]
         job.roteiro_url = result["roteiro_url"]
         job.audio_url = result["audio_url"]
         job.roteiro_char_count = len(result["roteiro_text"])
@@ -349,6 +391,27 @@ def process_job_task(self, job_id: str):
         db.close()
 
 
+@celery_app.task(bind=True, name='celery_tasks.generate_jobs_task')
+def generate_jobs_task(self, job_specs: list, user_id: int, agent_id: int):
+    """
+    Processa jobs criados por /jobs/generate fora do processo da API.
+    
+    Reaproveita o pipeline de main.process_jobs_concurrently; falhas ficam
+    registradas em cada job, por isso não há retry automático aqui.
+    
+    Args:
+        job_specs: Lista de (job_id, titulo)
+        user_id: ID do usuário
+        agent_id: ID do agente
+    """
+    # Import tardio: main carrega a aplicação FastAPI inteira
+    import main
+    
+    asyncio.run(main.process_jobs_concurrently(
+        [tuple(spec) for spec in job_specs], user_id, agent_id
+    ))
+
+
 async def process_job_pipeline(db, job, agent, gemini_key: str, tts_key: str) -> Dict[str, Any]:
     """
     Pipeline de processamento do job com paralelização.
@@ -411,51 +474,22 @@ async def process_job_pipeline(db, job, agent, gemini_key: str, tts_key: str) ->
         "roteiro_text": roteiro_adaptado,
         "roteiro_url": roteiro_url,
         "audio_url": audio_url,
-        "audio_duration": 120  # TODO: Calcular duração real
+        "audio_duration": audio_duration_seconds(mp3_duration(audio_data), roteiro_adaptado)
     }
 
 
 def update_batch_stats(db, batch_id: str):
     """
-    Atualiza estatísticas do batch.
+    Atualiza estatísticas do batch. Chamado sempre que um job chega a um
+    estado final, sem intervalo mínimo: a atualização do último job é a que
+    fecha o batch (status, progresso, completed_at) e invalida o cache.
     
     Args:
         db: Sessão do banco
         batch_id: ID do batch
     """
-    from sqlalchemy import func
-    
-    batch = db.query(models_batch.Batch).filter(
-        models_batch.Batch.id == batch_id
-    ).first()
-    
-    if not batch:
-        return
-    
-    # Contar jobs por status
-    stats = db.query(
-        models_batch.BatchJob.status,
-        func.count(models_batch.BatchJob.id)
-    ).filter(
-        models_batch.BatchJob.batch_id == batch_id
-    ).group_by(models_batch.BatchJob.status).all()
-    
-    status_counts = {status: count for status, count in stats}
-    
-    batch.completed_jobs = status_counts.get("completed", 0)
-    batch.failed_jobs = status_counts.get("failed", 0)
-    batch.running_jobs = status_counts.get("running", 0)
-    batch.progress_percentage = (batch.completed_jobs / batch.total_jobs * 100) if batch.total_jobs > 0 else 0
-    
-    # Atualizar status do batch
-    if batch.completed_jobs + batch.failed_jobs == batch.total_jobs:
-        batch.status = "completed" if batch.failed_jobs == 0 else "failed"
-        if not batch.completed_at:
-            batch.completed_at = datetime.utcnow()
-    elif batch.running_jobs > 0:
-        batch.status = "processing"
-        if not batch.started_at:
-            batch.started_at = datetime.utcnow()
-    
-    db.commit()
-    logger.info(f"[BATCH {batch_id}] Stats: {batch.completed_jobs}/{batch.total_jobs} completed, {batch.failed_jobs} failed")
+    stats = refresh_batch_stats(db, batch_id)
+    logger.info(
+        "[BATCH %s] Stats: %s completed, %s failed, %s running",
+        batch_id, stats["completed"], stats["failed"], stats["running"]
+    )
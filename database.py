@@ -1,6 +1,12 @@
 # database.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import orjson
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import NullPool
 from sqlalchemy.ext.declarative import declarative_base
 from settings import settings
 
@@ -15,15 +21,82 @@ if _db_url.startswith("postgres://"):
 if "host" in _db_url or "password" in _db_url:
     _db_url = "sqlite:///./bolt_ia.db"
     print(f"⚠️ Usando SQLite local: {_db_url}")
-    engine = create_engine(_db_url, connect_args={"check_same_thread": False})
+
+def _json_serializer(value) -> str:
+    return orjson.dumps(value).decode()
+
+# Colunas JSON (agentes, jobs, batches) serializadas com orjson
+_json_options = {
+    "json_serializer": _json_serializer,
+    "json_deserializer": orjson.loads,
+}
+
+if _db_url.startswith("sqlite"):
+    # SQLite não usa QueuePool (pool_size/max_overflow não se aplicam)
+    engine = create_engine(
+        _db_url,
+        connect_args={"check_same_thread": False},
+        **_json_options
+    )
 else:
+    # psycopg2: executemany via execute_values (INSERT) e execute_batch
+    # (UPDATE/DELETE) em páginas, em vez de um round-trip por linha
+    _executemany_options = {}
+    if make_url(_db_url).get_driver_name() == "psycopg2":
+        _executemany_options = {
+            "executemany_mode": "values_plus_batch",
+            "executemany_values_page_size": 1000,
+            "executemany_batch_page_size": 500,
+        }
+    
     engine = create_engine(
         _db_url,
+        **_json_options,
+        **_executemany_options,
+        pool_size=20,
+        max_overflow=10,
+        pool_timeout=30,
         pool_pre_ping=True,
-        pool_size=5,
-        max_overflow=10
+        pool_recycle=3600
     )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+
+def create_cli_engine():
+    """
+    Engine para scripts de linha de comando: sem pool (NullPool), cada
+    sessão abre e fecha a própria conexão, sem conexões ociosas no processo.
+    """
+    connect_args = {"check_same_thread": False} if _db_url.startswith("sqlite") else {}
+    return create_engine(
+        _db_url,
+        connect_args=connect_args,
+        poolclass=NullPool,
+        **_json_options
+    )
+
+
+@contextmanager
+def session_scope(session_factory=SessionLocal):
+    """
+    Sessão para scripts e tarefas fora das requisições: commit ao sair do
+    bloco, rollback em caso de exceção e fechamento sempre.
+    """
+    db = session_factory()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# Sessão por requisição: o middleware em main.py define o escopo e remove
+# a sessão ao final; dependências da mesma requisição compartilham a sessão
+request_scope: ContextVar = ContextVar("request_scope", default=None)
+SessionScoped = scoped_session(SessionLocal, scopefunc=request_scope.get)
+
+Base = declarative_base()
@@ -2,55 +2,103 @@
 
 import os
 import uuid
+import time
+import re
+import atexit
 import json
+import queue
 import logging
 import asyncio
 import base64
+import shutil
+import string
+import hashlib
+import threading
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime, timedelta, date
-from typing import List, Optional, Dict, Annotated
+from typing import List, NamedTuple, Optional, Dict, Tuple, Annotated
 from pathlib import Path
 
 from fastapi import (
     FastAPI, HTTPException, Depends, status, 
-    BackgroundTasks, UploadFile, File, Form, Request
+    BackgroundTasks, UploadFile, File, Form, Request, Response
 )
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jwt
 from argon2 import PasswordHasher
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, load_only, undefer_group
+from sqlalchemy import case, delete, func, insert, select, update
+from cachetools import LRUCache, TLRUCache, TTLCache
 
+import orjson
 import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from google.api_core import exceptions as google_exceptions
 from google.cloud import texttospeech
+try:
+    from google.cloud import storage  # opcional: só para o Long Audio TTS
+except ImportError:
+    storage = None
 from langdetect import detect
 
 import models
+from migrate_database import create_missing_columns
 import schemas
-from database import SessionLocal, engine
+from database import SessionLocal, SessionScoped, request_scope, engine
 from settings import settings
-from voices_config import PREMIUM_VOICES, get_all_voices, get_voice_by_id
+from cache_utils import FileCache, SemanticCache, SingleFlight, generate_cache_key
+from tts_utils import (
+    TTS_MAX_CHUNK_BYTES, split_text_into_chunks, run_tts,
+    mp3_duration, mp3_duration_from_file, audio_duration_seconds
+)
+from voices_config import get_all_voices_json, get_voice_by_id, get_voices_by_language_json
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Os handlers reais (stream/arquivo) rodam em uma thread própria; o event
+# loop só enfileira os registros
+_log_queue = queue.SimpleQueue()
+_root_logger = logging.getLogger()
+log_listener = QueueListener(_log_queue, *_root_logger.handlers, respect_handler_level=True)
+_root_logger.handlers = [QueueHandler(_log_queue)]
+log_listener.start()
+atexit.register(log_listener.stop)  # Esvazia a fila ao encerrar
+
 # Criar tabelas no banco de dados
 models.Base.metadata.create_all(bind=engine)
 
 # Criar diretórios necessários
-os.makedirs("files/audio", exist_ok=True)
+AUDIO_DIR = os.path.join("files", "audio")
+os.makedirs(AUDIO_DIR, exist_ok=True)
 os.makedirs("files/scripts", exist_ok=True)
 os.makedirs("files/images", exist_ok=True)
 os.makedirs("files/videos", exist_ok=True)
 
 # Configuração do FastAPI
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Subida do servidor"""
+    # create_all não altera tabelas existentes: adicionar colunas novas dos
+    # modelos (ex.: jobs.current_stage) em bancos criados por versões
+    # anteriores. Roda na subida da API, não no import do main (que o worker
+    # Celery também faz); workers subindo juntos não se atrapalham
+    await asyncio.to_thread(create_missing_columns)
+    yield
+
 app = FastAPI(
     title="BoredFy AI API",
     description="Backend para geração de roteiros e TTS com IA",
-    version="2.0.0"
+    version="2.0.0",
+    # Respostas serializadas com orjson (roteiros adaptados podem ser grandes)
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS
@@ -62,8 +110,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Escopo da sessão do banco por requisição
+@app.middleware("http")
+async def db_session_scope(request: Request, call_next):
+    token = request_scope.set(object())
+    try:
+        return await call_next(request)
+    finally:
+        SessionScoped.remove()
+        request_scope.reset(token)
+
+class GeneratedFilesStatic(StaticFiles):
+    """
+    Arquivos gerados têm nome único por job: o navegador pode reutilizá-los
+    por um dia. ETag/If-None-Match (304) já vêm do StaticFiles.
+    """
+    
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["Cache-Control"] = "private, max-age=86400"
+        return response
+
 # Servir arquivos estáticos
-app.mount("/files", StaticFiles(directory="files"), name="files")
+app.mount("/files", GeneratedFilesStatic(directory="files"), name="files")
 
 # Segurança
 pwd_hasher = PasswordHasher()
@@ -74,39 +143,141 @@ SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
+# Chave HMAC construída uma vez: passando a string, o jose tenta
+# json.loads e reconstrói a chave a cada encode/decode
+JWT_KEY = jwk.construct(SECRET_KEY, ALGORITHM)
+JWT_ALGORITHMS = (ALGORITHM,)
+
+# Cache semântico de roteiros (títulos parafraseados reaproveitam o resultado)
+EMBEDDING_MODEL = "models/text-embedding-004"
+script_semantic_cache = SemanticCache(threshold=0.92, max_entries=1000)
+
+# Coalescência de chamadas idênticas concorrentes (single-flight)
+script_inflight = SingleFlight()
+tts_inflight = SingleFlight()
+
+class CurrentUser(NamedTuple):
+    """Snapshot imutável do usuário autenticado (o que os endpoints usam)"""
+    id: int
+    email: str
+    created_at: Optional[datetime]
+
+
+# Tokens JWT já validados (blake2b(token) -> (email, exp)); a entrada
+# vive no máximo 60s e nunca além do exp do próprio token
+JWT_CACHE_TTL_SECONDS = 60
+jwt_user_cache = TLRUCache(
+    maxsize=10000,
+    ttu=lambda key, value, now: now + min(JWT_CACHE_TTL_SECONDS, value[1] - time.time())
+)
+
+# Usuários por email (email -> CurrentUser): evita o SELECT em users quando
+# o mesmo usuário chega com tokens diferentes, ex.: após novo login
+user_cache = TTLCache(maxsize=5000, ttl=60)
+
+# Os caches do cachetools não são thread-safe e get_current_user roda no
+# threadpool; este lock protege jwt_user_cache e user_cache
+user_cache_lock = threading.Lock()
+
+# Cache curto das API keys válidas por usuário ((tabela, user_id) -> key_value)
+api_key_cache = TTLCache(maxsize=1024, ttl=60)
+api_key_cache_lock = threading.Lock()  # acessado do threadpool (ver user_cache_lock)
+
+# Chaves Gemini já validadas com sucesso (sha256(chave) -> True); falhas
+# não são guardadas para que uma chave corrigida possa ser testada de novo
+validated_key_cache = TTLCache(maxsize=1024, ttl=300)
+
+# Clientes TTS reaproveitados por credencial (sha256(chave) -> cliente):
+# evita novo canal gRPC + handshake TLS a cada síntese
+tts_client_cache = LRUCache(maxsize=64)
+
+# Clientes Gemini por credencial (sha256(chave) -> GeminiClients): cada
+# chamada usa o cliente da própria key, nunca o estado global de
+# genai.configure, compartilhado pelos jobs de todos os usuários no loop
+gemini_client_cache = LRUCache(maxsize=64)
+
+# Fila de jobs por usuário (user_id -> linhas de JobResponse): absorve o
+# polling de várias abas; invalidada na criação, cancelamento e troca de status
+JOB_QUEUE_CACHE_TTL_SECONDS = 2
+job_queue_cache = TTLCache(maxsize=10000, ttl=JOB_QUEUE_CACHE_TTL_SECONDS)
+job_queue_cache_lock = threading.Lock()  # idem: threadpool + event loop
+
+# Cache em disco de áudios TTS (mesmo texto + voz = mesmo MP3)
+tts_file_cache = FileCache(
+    os.path.join(AUDIO_DIR, "_cache"),
+    max_files=2000,
+    suffix=".mp3",
+    max_age_seconds=7 * 24 * 3600
+)
+
+# Progresso dos jobs em andamento neste processo
+# (job_id -> (progress, current_stage)); o banco só é gravado a cada
+# JOB_FLUSH_INTERVAL_SECONDS ou na troca de status
+JOB_FLUSH_INTERVAL_SECONDS = 2.0
+job_progress_cache: Dict[str, Tuple[int, str]] = {}
+
 # =================================================================
 # == DEPENDÊNCIAS
 # =================================================================
 
 def get_db():
-    """Dependência para obter sessão do banco de dados"""
-    db = SessionLocal()
+    """Dependência para obter a sessão do banco da requisição atual"""
+    db = SessionScoped()
     try:
         yield db
     finally:
-        db.close()
+        SessionScoped.remove()
 
 def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     db: Session = Depends(get_db)
-) -> models.User:
+) -> CurrentUser:
     """Obtém o usuário atual a partir do token JWT"""
+    # Token já validado recentemente: pula jwt.decode (e a consulta, se o
+    # usuário ainda estiver em cache)
+    token_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    with user_cache_lock:
+        cached = jwt_user_cache.get(token_key)
+        user = user_cache.get(cached[0]) if cached is not None else None
+    if user is not None:
+        return user
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar as credenciais",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    if cached is not None:
+        email = cached[0]
+    else:
+        try:
+            payload = jwt.decode(token, JWT_KEY, algorithms=JWT_ALGORITHMS)
+            email: str = payload.get("sub")
+            if email is None:
+                raise credentials_exception
+        except JWTError:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.email == email).first()
+    with user_cache_lock:
+        user = user_cache.get(email)
     if user is None:
-        raise credentials_exception
+        row = db.execute(
+            select(models.User.id, models.User.email, models.User.created_at)
+            .where(models.User.email == email)
+        ).first()
+        if row is None:
+            raise credentials_exception
+        
+        # Snapshot imutável em vez da instância ORM: pode ser compartilhado
+        # entre threads e não depende da sessão da requisição
+        user = CurrentUser(*row)
+        with user_cache_lock:
+            user_cache[email] = user
+    if cached is None:
+        exp = payload.get("exp")
+        if exp is not None:
+            with user_cache_lock:
+                jwt_user_cache[token_key] = (email, exp)
     return user
 
 # =================================================================
@@ -121,7 +292,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, JWT_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -142,46 +313,110 @@ def mask_api_key(key: str) -> str:
         return "****"
     return f"{key[:4]}...{key[-4:]}"
 
-def update_user_stats(db: Session, user_id: int, stat_type: str, value: int = 1):
-    """Atualiza estatísticas do usuário e gamificação"""
-    stats = db.query(models.UserStats).filter(models.UserStats.user_id == user_id).first()
+# Chaves do Google começam com "AIza" seguidas de letras, dígitos, "_" ou "-"
+_API_KEY_PREFIX = "AIza"
+_API_KEY_MIN_LEN = 14
+_API_KEY_ALLOWED_CHARS = frozenset(string.ascii_letters + string.digits + "_-")
+
+def is_api_key_format_valid(key: str) -> bool:
+    """Checa o formato de uma API key do Google sem regex nem chamada de rede"""
+    return (
+        key.startswith(_API_KEY_PREFIX)
+        and len(key) >= _API_KEY_MIN_LEN
+        and not set(key[len(_API_KEY_PREFIX):]) - _API_KEY_ALLOWED_CHARS
+    )
+
+def get_valid_key_value(db: Session, key_model, user_id: int) -> Optional[str]:
+    """
+    Retorna a primeira chave válida do usuário (models.ApiKey ou
+    models.TtsApiKey), consultando só a coluna key_value com LIMIT 1.
+    """
+    cache_key = (key_model.__tablename__, user_id)
+    with api_key_cache_lock:
+        value = api_key_cache.get(cache_key)
+    if value is not None:
+        return value
     
-    if not stats:
-        stats = models.UserStats(user_id=user_id)
-        db.add(stats)
+    row = db.query(key_model.key_value).filter(
+        key_model.user_id == user_id,
+        key_model.is_valid == True
+    ).first()
     
-    # Atualizar streak
+    if row is None:
+        return None
+    with api_key_cache_lock:
+        api_key_cache[cache_key] = row.key_value
+    return row.key_value
+
+def invalidate_api_key_cache(user_id: int):
+    """Remove as chaves do usuário do cache (após adicionar/remover)"""
+    with api_key_cache_lock:
+        for key_model in (models.ApiKey, models.TtsApiKey):
+            api_key_cache.pop((key_model.__tablename__, user_id), None)
+
+# XP por roteiro e por áudio gerado
+XP_PER_SCRIPT = 10
+XP_PER_TTS = 5
+
+def update_user_stats(db: Session, user_id: int, scripts: int = 0, tts: int = 0, audio_duration: int = 0):
+    """
+    Soma as estatísticas de um job concluído e atualiza streak/nível em um
+    único UPDATE (incrementos calculados pelo banco, sem ler a linha).
+    As alterações ficam na transação para o commit do chamador.
+    """
+    UserStats = models.UserStats
     today = date.today()
-    if stats.last_active_date != today:
-        if stats.last_active_date == today - timedelta(days=1):
-            stats.streak_count += 1
-        else:
-            stats.streak_count = 1
-        stats.last_active_date = today
-        stats.days_active += 1
-    
-    # Atualizar stats específicas
-    if stat_type == "script":
-        stats.scripts_today += value
-        stats.scripts_week += value
-        stats.scripts_month += value
-        stats.scripts_total += value
-        stats.xp += 10 * value  # 10 XP por roteiro
-    elif stat_type == "tts":
-        stats.tts_today += value
-        stats.tts_week += value
-        stats.tts_month += value
-        stats.tts_total += value
-        stats.xp += 5 * value  # 5 XP por TTS
-    elif stat_type == "audio_duration":
-        stats.total_audio_duration += value
-    
-    # Calcular nível baseado em XP
-    stats.level = (stats.xp // 100) + 1
+    xp = XP_PER_SCRIPT * scripts + XP_PER_TTS * tts
     
-    db.commit()
-    db.refresh(stats)
-    return stats
+    result = db.execute(
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(
+            streak_count=case(
+                (UserStats.last_active_date == today, UserStats.streak_count),
+                (UserStats.last_active_date == today - timedelta(days=1), UserStats.streak_count + 1),
+                else_=1
+            ),
+            days_active=case(
+                (UserStats.last_active_date == today, UserStats.days_active),
+                else_=UserStats.days_active + 1
+            ),
+            last_active_date=today,
+            scripts_today=UserStats.scripts_today + scripts,
+            scripts_week=UserStats.scripts_week + scripts,
+            scripts_month=UserStats.scripts_month + scripts,
+            scripts_total=UserStats.scripts_total + scripts,
+            tts_today=UserStats.tts_today + tts,
+            tts_week=UserStats.tts_week + tts,
+            tts_month=UserStats.tts_month + tts,
+            tts_total=UserStats.tts_total + tts,
+            total_audio_duration=UserStats.total_audio_duration + audio_duration,
+            xp=UserStats.xp + xp,
+            # Nível baseado em XP. Divisão exata (tira o resto antes): "/" entre
+            # inteiros é truncada no SQLAlchemy 1.4 mas vira divisão real no 2.0
+            level=(UserStats.xp + xp - (UserStats.xp + xp) % 100) / 100 + 1
+        )
+        .execution_options(synchronize_session=False)
+    )
+    
+    if result.rowcount == 0:
+        db.add(UserStats(
+            user_id=user_id,
+            streak_count=1,
+            days_active=1,
+            last_active_date=today,
+            scripts_today=scripts,
+            scripts_week=scripts,
+            scripts_month=scripts,
+            scripts_total=scripts,
+            tts_today=tts,
+            tts_week=tts,
+            tts_month=tts,
+            tts_total=tts,
+            total_audio_duration=audio_duration,
+            xp=xp,
+            level=xp // 100 + 1
+        ))
 
 # =================================================================
 # == ENDPOINTS DE AUTENTICAÇÃO
@@ -201,6 +436,8 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    with user_cache_lock:
+        user_cache.pop(new_user.email, None)
     
     # Criar stats iniciais
     stats = models.UserStats(user_id=new_user.id)
@@ -231,7 +468,7 @@ def login(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/auth/me", response_model=schemas.User)
-def get_me(current_user: models.User = Depends(get_current_user)):
+def get_me(current_user: CurrentUser = Depends(get_current_user)):
     """Retorna informações do usuário atual"""
     return current_user
 
@@ -242,18 +479,26 @@ def get_me(current_user: models.User = Depends(get_current_user)):
 @app.post("/api-keys/validate")
 async def validate_api_key(
     data: schemas.ApiKeyValidate,
-    current_user: models.User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Valida uma API key do Gemini"""
+    if not is_api_key_format_valid(data.api_key):
+        return {"is_valid": False, "message": "Formato de chave inválido"}
+    
+    key_hash = hashlib.sha256(data.api_key.encode()).digest()
+    if key_hash in validated_key_cache:
+        return {"is_valid": True, "message": "Chave válida", "cached": True}
+    
     try:
-        # Configurar Gemini com a chave
-        genai.configure(api_key=data.api_key)
-        
-        # Fazer uma chamada de teste simples
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        response = model.generate_content("Test")
+        # Fazer uma chamada de teste simples com o cliente da própria chave
+        model = bind_gemini_model(
+            genai.GenerativeModel(GEMINI_MODEL),
+            get_gemini_clients(data.api_key)
+        )
+        response = await model.generate_content_async("Test")
         
         if response:
+            validated_key_cache[key_hash] = True
             return {"is_valid": True, "message": "Chave válida"}
         else:
             return {"is_valid": False, "message": "Chave inválida"}
@@ -261,22 +506,11 @@ async def validate_api_key(
         logger.error(f"Erro ao validar API key: {str(e)}")
         return {"is_valid": False, "message": f"Erro: {str(e)}"}
 
-@app.post("/api-keys/add")
-async def add_api_key(
-    data: schemas.ApiKeyAdd,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Adiciona uma API key após validação"""
-    # Validar a chave primeiro
-    validation = await validate_api_key(schemas.ApiKeyValidate(api_key=data.api_key), current_user)
-    
-    if not validation["is_valid"]:
-        raise HTTPException(status_code=400, detail="Chave de API inválida")
-    
+def store_api_key(db: Session, user_id: int, data: schemas.ApiKeyAdd) -> int:
+    """Grava uma API key já validada e retorna o ID (chamado via asyncio.to_thread)"""
     # Verificar se já existe
-    existing = db.query(models.ApiKey).filter(
-        models.ApiKey.user_id == current_user.id,
+    existing = db.query(models.ApiKey.id).filter(
+        models.ApiKey.user_id == user_id,
         models.ApiKey.key_value == data.api_key
     ).first()
     
@@ -285,7 +519,7 @@ async def add_api_key(
     
     # Adicionar ao banco
     new_key = models.ApiKey(
-        user_id=current_user.id,
+        user_id=user_id,
         key_value=data.api_key,
         service=data.service,
         is_valid=True,
@@ -293,24 +527,42 @@ async def add_api_key(
     )
     db.add(new_key)
     db.commit()
-    db.refresh(new_key)
+    return new_key.id
+
+@app.post("/api-keys/add")
+async def add_api_key(
+    data: schemas.ApiKeyAdd,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Adiciona uma API key após validação"""
+    # Validar a chave primeiro
+    validation = await validate_api_key(schemas.ApiKeyValidate(api_key=data.api_key), current_user)
+    
+    if not validation["is_valid"]:
+        raise HTTPException(status_code=400, detail="Chave de API inválida")
+    
+    # Consulta e gravação com driver síncrono: fora do event loop
+    key_id = await asyncio.to_thread(store_api_key, db, current_user.id, data)
+    invalidate_api_key_cache(current_user.id)
     
     return {
         "success": True,
         "message": "Chave adicionada com sucesso!",
-        "key_id": new_key.id
+        "key_id": key_id
     }
 
 @app.get("/api-keys", response_model=List[schemas.ApiKeyResponse])
 def get_api_keys(
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Retorna as API keys do usuário (mascaradas)"""
     keys = db.query(models.ApiKey).filter(models.ApiKey.user_id == current_user.id).all()
     
+    # Dados vindos do banco: model_construct dispensa a revalidação por campo
     return [
-        schemas.ApiKeyResponse(
+        schemas.ApiKeyResponse.model_construct(
             id=key.id,
             service=key.service,
             key_masked=mask_api_key(key.key_value),
@@ -321,73 +573,106 @@ def get_api_keys(
         for key in keys
     ]
 
-@app.delete("/api-keys/{key_id}")
+@app.delete("/api-keys/{key_id}", status_code=204)
 def delete_api_key(
     key_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Deleta uma API key"""
-    key = db.query(models.ApiKey).filter(
-        models.ApiKey.id == key_id,
-        models.ApiKey.user_id == current_user.id
-    ).first()
-    
-    if not key:
+    # DELETE direto (sem SELECT prévio); nenhuma linha afetada = 404
+    result = db.execute(
+        delete(models.ApiKey.__table__).where(
+            models.ApiKey.id == key_id,
+            models.ApiKey.user_id == current_user.id
+        )
+    )
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Chave não encontrada")
     
-    db.delete(key)
     db.commit()
+    invalidate_api_key_cache(current_user.id)
     
-    return {"success": True, "message": "Chave removida com sucesso"}
+    return Response(status_code=204)
 
 
 # =================================================================
 # == ENDPOINTS DE AGENTES
 # =================================================================
 
+# Colunas de agents que compõem AgentResponse (mesmos nomes dos campos)
+AGENT_RESPONSE_COLUMNS = [
+    models.Agent.__table__.c[name] for name in schemas.AgentResponse.model_fields
+]
+
+def execute_returning_agent(db: Session, stmt, user_id: int, agent_id: Optional[int] = None):
+    """
+    Executa um INSERT/UPDATE em agents e devolve a linha resultante com as
+    colunas de AgentResponse. Com RETURNING (Postgres) é um único round-trip;
+    nos demais dialetos, a instrução seguida de um SELECT.
+    
+    Returns:
+        RowMapping do agente ou None se nenhuma linha foi afetada
+    """
+    if db.get_bind().dialect.full_returning:
+        return db.execute(stmt.returning(*AGENT_RESPONSE_COLUMNS)).mappings().first()
+    
+    result = db.execute(stmt)
+    if agent_id is None:
+        agent_id = result.inserted_primary_key[0]
+    return db.execute(
+        select(*AGENT_RESPONSE_COLUMNS).where(
+            models.Agent.id == agent_id,
+            models.Agent.user_id == user_id
+        )
+    ).mappings().first()
+
 @app.post("/agents", response_model=schemas.AgentResponse)
 def create_agent(
     agent: schemas.AgentCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Cria um novo agente"""
-    new_agent = models.Agent(
-        user_id=current_user.id,
-        name=agent.name,
-        agent_type=agent.agent_type,
-        idioma_principal=agent.idioma_principal,
-        premise_prompt=agent.premise_prompt,
-        script_prompt=agent.script_prompt,
-        block_structure=agent.block_structure,
-        cultural_adaptation_prompt=agent.cultural_adaptation_prompt,
-        idiomas_adicionais=agent.idiomas_adicionais,
-        tts_enabled=agent.tts_enabled,
-        tts_voices=agent.tts_voices,
-        visual_media_enabled=agent.visual_media_enabled,
-        visual_media_type=agent.visual_media_type,
-        visual_media_config=agent.visual_media_config
+    row = execute_returning_agent(
+        db,
+        insert(models.Agent.__table__).values(user_id=current_user.id, **agent.dict()),
+        current_user.id
     )
-    db.add(new_agent)
     db.commit()
-    db.refresh(new_agent)
     
-    return new_agent
+    return schemas.AgentResponse.model_construct(**row)
 
 @app.get("/agents", response_model=List[schemas.AgentResponse])
 def get_agents(
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Retorna todos os agentes do usuário"""
-    agents = db.query(models.Agent).filter(models.Agent.user_id == current_user.id).all()
-    return agents
+    # Linhas do banco são confiáveis: projeção direta nas colunas da
+    # resposta e model_construct, sem hidratar ORM nem revalidar campos
+    rows = db.execute(
+        select(*AGENT_RESPONSE_COLUMNS).where(models.Agent.user_id == current_user.id)
+    ).mappings()
+    return [schemas.AgentResponse.model_construct(**row) for row in rows]
+
+@app.get("/agents/summary", response_model=List[schemas.AgentSummary])
+def get_agents_summary(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Lista os agentes do usuário sem os prompts (seleção de agente na UI)"""
+    return db.query(
+        models.Agent.id,
+        models.Agent.name,
+        models.Agent.agent_type,
+        models.Agent.idioma_principal
+    ).filter(models.Agent.user_id == current_user.id).all()
 
 @app.get("/agents/{agent_id}", response_model=schemas.AgentResponse)
 def get_agent(
     agent_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Retorna um agente específico"""
@@ -405,68 +690,285 @@ def get_agent(
 def update_agent(
     agent_id: int,
     agent_update: schemas.AgentUpdate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Atualiza um agente"""
-    agent = db.query(models.Agent).filter(
-        models.Agent.id == agent_id,
-        models.Agent.user_id == current_user.id
-    ).first()
+    # Campos fornecidos gravados em um único UPDATE (sem SELECT prévio)
+    update_data = agent_update.dict(exclude_unset=True)
+    if update_data:
+        row = execute_returning_agent(
+            db,
+            update(models.Agent.__table__).where(
+                models.Agent.id == agent_id,
+                models.Agent.user_id == current_user.id
+            ).values(**update_data),
+            current_user.id,
+            agent_id
+        )
+    else:
+        row = db.execute(
+            select(*AGENT_RESPONSE_COLUMNS).where(
+                models.Agent.id == agent_id,
+                models.Agent.user_id == current_user.id
+            )
+        ).mappings().first()
     
-    if not agent:
+    if row is None:
         raise HTTPException(status_code=404, detail="Agente não encontrado")
     
-    # Atualizar campos fornecidos
-    update_data = agent_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(agent, field, value)
-    
     db.commit()
-    db.refresh(agent)
     
-    return agent
+    return schemas.AgentResponse.model_construct(**row)
 
-@app.delete("/agents/{agent_id}")
+@app.delete("/agents/{agent_id}", status_code=204)
 def delete_agent(
     agent_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Deleta um agente"""
-    agent = db.query(models.Agent).filter(
-        models.Agent.id == agent_id,
-        models.Agent.user_id == current_user.id
-    ).first()
-    
-    if not agent:
+    # DELETE direto (sem SELECT prévio); nenhuma linha afetada = 404
+    result = db.execute(
+        delete(models.Agent.__table__).where(
+            models.Agent.id == agent_id,
+            models.Agent.user_id == current_user.id
+        )
+    )
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Agente não encontrado")
     
-    db.delete(agent)
     db.commit()
     
-    return {"success": True, "message": "Agente removido com sucesso"}
+    return Response(status_code=204)
 
 # =================================================================
 # == ENDPOINTS DE VOZES
 # =================================================================
 
+def get_voices_payload(language_code: Optional[str] = None) -> bytes:
+    """
+    Corpo de /voices e /voices/{language_code}: envelope montado em volta
+    do array de vozes já serializado uma vez pelo voices_config.
+    """
+    if language_code is None:
+        return b'{"voices":' + get_all_voices_json() + b'}'
+    header = orjson.dumps({"language_code": language_code})
+    return header[:-1] + b',"voices":' + get_voices_by_language_json(language_code) + b'}'
+
+def voices_response(language_code: Optional[str] = None) -> Response:
+    """Resposta com o corpo de vozes já serializado, cacheável pelo cliente"""
+    return Response(
+        content=get_voices_payload(language_code),
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=86400"}
+    )
+
 @app.get("/voices")
 def get_voices():
     """Retorna todas as vozes premium disponíveis"""
-    return {"voices": get_all_voices()}
+    return voices_response()
 
 @app.get("/voices/{language_code}")
 def get_voices_by_language(language_code: str):
     """Retorna vozes para um idioma específico"""
-    voices = [v for v in PREMIUM_VOICES if v["language_code"] == language_code]
-    return {"language_code": language_code, "voices": voices}
+    return voices_response(language_code)
 
 
 # =================================================================
 # == FUNÇÕES DE GERAÇÃO (GEMINI)
 # =================================================================
 
+# Templates de prompt (montados uma vez; só os campos variáveis mudam por chamada)
+# O prefixo depende apenas do agente e pode ser guardado no cachedContent do Gemini
+SCRIPT_PROMPT_PREFIX_TEMPLATE = """
+{premise_prompt}
+
+{script_prompt}
+
+{block_structure}
+"""
+
+SCRIPT_PROMPT_TAIL_TEMPLATE = """
+Título/Premissa: {titulo}
+
+Gere um roteiro completo seguindo as instruções acima.
+"""
+
+# Cabeça (instrução cultural + roteiro) é a mesma para todos os idiomas do
+# job: montada uma vez; por idioma só a cauda muda
+ADAPTATION_PROMPT_HEAD_TEMPLATE = """
+{cultural_prompt}
+
+Roteiro original:
+{script}
+"""
+
+ADAPTATION_PROMPT_TAIL_TEMPLATE = """
+Idioma alvo: {target_language}
+
+Adapte o roteiro acima para o idioma {target_language}, mantendo a essência mas adaptando referências culturais, expressões e contexto para o público local.
+"""
+
+DEFAULT_CULTURAL_PROMPT = "Adapte culturalmente o seguinte roteiro:"
+
+# Modelo único para todas as gerações: um cachedContent só serve ao modelo
+# para o qual foi criado, e o caminho sem cache deve gerar igual
+GEMINI_MODEL = "models/gemini-2.0-flash-001"
+
+# Prompt caching (cachedContent) do prefixo estático por agente
+PROMPT_CACHE_TTL = timedelta(hours=1)
+SCRIPT_CACHE_TTL = timedelta(minutes=10)
+
+# (API key, agente) -> CachedContent, ou None se a API recusou o cache;
+# renovado um pouco antes do TTL do servidor
+_prompt_caches = TTLCache(
+    maxsize=1024,
+    ttl=(PROMPT_CACHE_TTL - timedelta(minutes=1)).total_seconds()
+)
+_PROMPT_CACHE_MISS = object()
+
+def agent_config_hash(agent: models.Agent) -> str:
+    """Hash da configuração do agente que influencia o roteiro gerado"""
+    data = "|".join([
+        agent.idioma_principal or "",
+        agent.premise_prompt or "",
+        agent.script_prompt or "",
+        agent.block_structure or "",
+    ])
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+class GeminiClients(NamedTuple):
+    """Clientes do Gemini presos a uma API key"""
+    generative: glm.GenerativeServiceAsyncClient
+    cache: glm.CacheServiceClient
+
+def get_gemini_clients(api_key: str) -> GeminiClients:
+    """Retorna os clientes Gemini da API key, criando-os só na primeira vez"""
+    key_hash = hashlib.sha256(api_key.encode()).digest()
+    clients = gemini_client_cache.get(key_hash)
+    if clients is None:
+        options = {"api_key": api_key}
+        clients = GeminiClients(
+            generative=glm.GenerativeServiceAsyncClient(client_options=options),
+            cache=glm.CacheServiceClient(client_options=options)
+        )
+        gemini_client_cache[key_hash] = clients
+    return clients
+
+def bind_gemini_model(model: genai.GenerativeModel, clients: GeminiClients) -> genai.GenerativeModel:
+    """
+    Liga o modelo ao cliente da key. Sem isso o GenerativeModel pega o
+    cliente global (último genai.configure) na primeira chamada.
+    """
+    model._async_client = clients.generative
+    return model
+
+def create_cached_content(clients: GeminiClients, text: str, ttl: timedelta) -> genai.protos.CachedContent:
+    """
+    Cria um cachedContent com o cliente da key (CachedContent.create usaria
+    o cliente global). Chamada bloqueante: rodar via asyncio.to_thread.
+    """
+    return clients.cache.create_cached_content(
+        request=genai.protos.CreateCachedContentRequest(
+            cached_content=genai.protos.CachedContent(
+                model=GEMINI_MODEL,
+                contents=[genai.protos.Content(role="user", parts=[genai.protos.Part(text=text)])],
+                ttl=ttl
+            )
+        )
+    )
+
+async def embed_title(clients: GeminiClients, titulo: str, idioma: str) -> Optional[List[float]]:
+    """Gera o embedding de (título + idioma) para o cache semântico"""
+    try:
+        result = await genai.embed_content_async(
+            model=EMBEDDING_MODEL,
+            content=f"{titulo}\n{idioma}",
+            task_type="semantic_similarity",
+            client=clients.generative
+        )
+        return result["embedding"]
+    except Exception as e:
+        logger.warning(f"Embedding indisponível, ignorando cache semântico: {str(e)}")
+        return None
+
+async def get_prompt_cached_model(
+    api_key: str,
+    agent: models.Agent,
+    agent_hash: str
+) -> Optional[genai.GenerativeModel]:
+    """
+    Retorna um modelo ligado ao cachedContent com o prefixo do agente.
+    O cache é criado uma vez por (API key, agente) e renovado ao expirar.
+    Retorna None se o prompt caching não estiver disponível (ex: prefixo
+    menor que o mínimo de tokens aceito pela API).
+    """
+    key = generate_cache_key(
+        "prompt_cache",
+        api_key=hashlib.sha256(api_key.encode()).hexdigest(),
+        agent=agent_hash
+    )
+    clients = get_gemini_clients(api_key)
+    cached_content = _prompt_caches.get(key, _PROMPT_CACHE_MISS)
+    
+    if cached_content is _PROMPT_CACHE_MISS:
+        prefix = SCRIPT_PROMPT_PREFIX_TEMPLATE.format(
+            premise_prompt=agent.premise_prompt,
+            script_prompt=agent.script_prompt,
+            block_structure=agent.block_structure
+        )
+        try:
+            cached_content = await asyncio.to_thread(
+                create_cached_content, clients, prefix, PROMPT_CACHE_TTL
+            )
+            logger.info(f"Prompt cache criado para o agente {agent.id}: {cached_content.name}")
+        except Exception as e:
+            logger.info(f"Prompt caching indisponível para o agente {agent.id}: {str(e)}")
+            cached_content = None
+        _prompt_caches[key] = cached_content
+    
+    if cached_content is None:
+        return None
+    return bind_gemini_model(
+        genai.GenerativeModel.from_cached_content(cached_content=cached_content),
+        clients
+    )
+
+def build_adaptation_prompt_head(agent: models.Agent, script: str) -> str:
+    """Monta a parte do prompt de adaptação que não depende do idioma"""
+    return ADAPTATION_PROMPT_HEAD_TEMPLATE.format(
+        cultural_prompt=agent.cultural_adaptation_prompt or DEFAULT_CULTURAL_PROMPT,
+        script=script
+    )
+
+async def create_script_cache(api_key: str, prompt_head: str):
+    """
+    Envia a cabeça do prompt de adaptação (com o roteiro master) uma vez
+    como cachedContent para ser reaproveitada pelas adaptações do job.
+    O chamador deve apagar o cache ao terminar (delete_script_cache).
+    
+    Returns:
+        CachedContent, ou None se a API recusar (ex: roteiro curto demais)
+    """
+    try:
+        return await asyncio.to_thread(
+            create_cached_content, get_gemini_clients(api_key), prompt_head, SCRIPT_CACHE_TTL
+        )
+    except Exception as e:
+        logger.info(f"Prompt caching indisponível para o roteiro: {str(e)}")
+        return None
+
+async def delete_script_cache(api_key: str, script_cache: genai.protos.CachedContent):
+    """Apaga o cache do roteiro com o cliente da mesma key que o criou"""
+    try:
+        await asyncio.to_thread(
+            get_gemini_clients(api_key).cache.delete_cached_content,
+            name=script_cache.name
+        )
+    except Exception as e:
+        logger.warning(f"Erro ao remover cache do roteiro: {str(e)}")
+
 async def generate_script_with_gemini(
     api_key: str,
     agent: models.Agent,
@@ -474,59 +976,202 @@ async def generate_script_with_gemini(
 ) -> str:
     """Gera um roteiro usando o Gemini"""
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        clients = get_gemini_clients(api_key)
         
-        # Construir o prompt completo
-        prompt = f"""
-{agent.premise_prompt}
-
-{agent.script_prompt}
-
-{agent.block_structure}
-
-Título/Premissa: {titulo}
-
-Gere um roteiro completo seguindo as instruções acima.
-"""
+        # Verificar cache semântico antes de chamar o LLM
+        agent_hash = agent_config_hash(agent)
+        embedding = await embed_title(clients, titulo, agent.idioma_principal)
+        if embedding is not None:
+            # Varredura linear em CPU: fora do event loop
+            cached = await asyncio.to_thread(script_semantic_cache.lookup, embedding, agent_hash)
+            if cached is not None:
+                return cached
         
-        response = model.generate_content(prompt)
-        return response.text
+        async def generate() -> str:
+            tail = SCRIPT_PROMPT_TAIL_TEMPLATE.format(titulo=titulo)
+            
+            # Com prompt caching, só a parte dinâmica é enviada
+            model = await get_prompt_cached_model(api_key, agent, agent_hash)
+            if model is not None:
+                prompt = tail
+            else:
+                model = bind_gemini_model(genai.GenerativeModel(GEMINI_MODEL), clients)
+                prompt = SCRIPT_PROMPT_PREFIX_TEMPLATE.format(
+                    premise_prompt=agent.premise_prompt,
+                    script_prompt=agent.script_prompt,
+                    block_structure=agent.block_structure
+                ) + tail
+            
+            # Streaming: os tokens chegam enquanto o modelo ainda gera
+            response = await model.generate_content_async(prompt, stream=True)
+            parts = []
+            async for chunk in response:
+                if chunk.parts:
+                    parts.append(chunk.text)
+            return "".join(parts)
+        
+        # Chamadas concorrentes para o mesmo título/agente aguardam a primeira
+        inflight_key = generate_cache_key("roteiro", agent=agent_hash, titulo=titulo)
+        roteiro = await script_inflight.do(inflight_key, generate)
+        
+        if embedding is not None:
+            script_semantic_cache.add(embedding, agent_hash, roteiro)
+        
+        return roteiro
     
     except Exception as e:
         logger.error(f"Erro ao gerar roteiro: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro ao gerar roteiro: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar roteiro: {str(e)}") from e
 
 async def adapt_script_to_language(
     api_key: str,
     agent: models.Agent,
     script: str,
-    target_language: str
+    target_language: str,
+    script_cache=None,
+    prompt_head: Optional[str] = None
 ) -> str:
-    """Adapta um roteiro para outro idioma com adaptação cultural"""
+    """
+    Adapta um roteiro para outro idioma com adaptação cultural.
+    Com script_cache (ver create_script_cache) o roteiro não é reenviado;
+    prompt_head evita remontar a parte invariável do prompt por idioma.
+    """
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        clients = get_gemini_clients(api_key)
+        tail = ADAPTATION_PROMPT_TAIL_TEMPLATE.format(target_language=target_language)
         
-        cultural_prompt = agent.cultural_adaptation_prompt or "Adapte culturalmente o seguinte roteiro:"
+        if script_cache is not None:
+            model = bind_gemini_model(
+                genai.GenerativeModel.from_cached_content(cached_content=script_cache), clients
+            )
+            prompt = tail
+        else:
+            model = bind_gemini_model(genai.GenerativeModel(GEMINI_MODEL), clients)
+            if prompt_head is None:
+                prompt_head = build_adaptation_prompt_head(agent, script)
+            prompt = prompt_head + tail
         
-        prompt = f"""
-{cultural_prompt}
+        # Versão assíncrona para que adaptações paralelas não bloqueiem o loop
+        response = await model.generate_content_async(prompt)
+        return response.text
+    
+    except Exception as e:
+        logger.error(f"Erro ao adaptar roteiro: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao adaptar roteiro: {str(e)}") from e
 
-Idioma alvo: {target_language}
+# Configuração de áudio fixa para todas as sínteses
+TTS_AUDIO_CONFIG = texttospeech.AudioConfig(
+    audio_encoding=texttospeech.AudioEncoding.MP3,
+    speaking_rate=1.0,
+    pitch=0.0
+)
 
-Roteiro original:
-{script}
+# O Long Audio API só aceita LINEAR16; o WAV resultante vira MP3 no ffmpeg
+TTS_LONG_AUDIO_CONFIG = texttospeech.AudioConfig(
+    audio_encoding=texttospeech.AudioEncoding.LINEAR16,
+    speaking_rate=TTS_AUDIO_CONFIG.speaking_rate,
+    pitch=TTS_AUDIO_CONFIG.pitch
+)
 
-Adapte o roteiro acima para o idioma {target_language}, mantendo a essência mas adaptando referências culturais, expressões e contexto para o público local.
-"""
-        
-        response = model.generate_content(prompt)
-        return response.text
+@lru_cache(maxsize=256)
+def get_voice_params(voice_id: str) -> Optional[texttospeech.VoiceSelectionParams]:
+    """Resolve o voice_id do catálogo em VoiceSelectionParams (memoizado)"""
+    voice_info = get_voice_by_id(voice_id)
+    if not voice_info:
+        return None
+    return texttospeech.VoiceSelectionParams(
+        language_code=voice_info.language_code,
+        name=voice_id
+    )
+
+@lru_cache(maxsize=1)
+def get_long_audio_clients():
+    """
+    Cliente do Long Audio TTS e bucket de saída, criados uma vez e
+    compartilhados (clientes gRPC/HTTP do Google são thread-safe).
+    """
+    client = texttospeech.TextToSpeechLongAudioSynthesizeClient()
+    bucket = storage.Client().bucket(settings.TTS_LONG_AUDIO_BUCKET)
+    return client, bucket
+
+async def wav_to_mp3(wav: bytes) -> bytes:
+    """Converte WAV (LINEAR16) em MP3 com o ffmpeg, via pipes"""
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-loglevel", "error", "-i", "pipe:0", "-f", "mp3", "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    mp3, stderr = await process.communicate(wav)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg falhou: {stderr.decode(errors='replace').strip()}")
+    return mp3
+
+async def synthesize_long_audio(
+    text: str,
+    voice: texttospeech.VoiceSelectionParams
+) -> Optional[bytes]:
+    """
+    Sintetiza textos longos em uma única requisição via Long Audio API.
+    O WAV é gravado no GCS, baixado, removido do bucket e convertido para MP3.
+    
+    Returns:
+        Bytes do MP3, ou None se o Long Audio estiver desligado, não
+        configurado ou falhar (o chamador volta para a síntese em chunks)
+    """
+    if not (
+        settings.TTS_LONG_AUDIO_ENABLED
+        and settings.GCP_PROJECT_ID
+        and settings.TTS_LONG_AUDIO_BUCKET
+    ):
+        return None
+    
+    if storage is None:
+        logger.info("google-cloud-storage não instalado, usando TTS em chunks")
+        return None
+    
+    if shutil.which("ffmpeg") is None:
+        logger.info("ffmpeg não encontrado, usando TTS em chunks")
+        return None
     
+    blob_name = f"tmp/{uuid.uuid4()}.wav"
+    
+    def run() -> bytes:
+        client, bucket = get_long_audio_clients()
+        request = texttospeech.SynthesizeLongAudioRequest(
+            parent=f"projects/{settings.GCP_PROJECT_ID}/locations/{settings.GCP_LOCATION}",
+            input=texttospeech.SynthesisInput(text=text),
+            voice=voice,
+            audio_config=TTS_LONG_AUDIO_CONFIG,
+            output_gcs_uri=f"gs://{settings.TTS_LONG_AUDIO_BUCKET}/{blob_name}"
+        )
+        operation = client.synthesize_long_audio(request=request)
+        blob = bucket.blob(blob_name)
+        try:
+            operation.result(timeout=600)
+            return blob.download_as_bytes()
+        finally:
+            # Também em erro/timeout: o WAV (ou parte dele) não fica no bucket
+            try:
+                blob.delete()
+            except google_exceptions.NotFound:
+                pass
+    
+    try:
+        return await wav_to_mp3(await asyncio.to_thread(run))
     except Exception as e:
-        logger.error(f"Erro ao adaptar roteiro: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro ao adaptar roteiro: {str(e)}")
+        logger.warning(f"Long Audio TTS falhou, usando TTS em chunks: {str(e)}")
+        return None
+
+def get_tts_client(tts_api_key: str) -> texttospeech.TextToSpeechClient:
+    """Retorna o cliente TTS da credencial, criando-o só na primeira vez"""
+    key_hash = hashlib.sha256(tts_api_key.encode()).digest()
+    client = tts_client_cache.get(key_hash)
+    if client is None:
+        os.environ['GOOGLE_APPLICATION_CREDENTIALS_JSON'] = tts_api_key
+        client = texttospeech.TextToSpeechClient()
+        tts_client_cache[key_hash] = client
+    return client
 
 async def generate_tts_audio(
     tts_api_key: str,
@@ -536,47 +1181,61 @@ async def generate_tts_audio(
 ) -> int:
     """Gera áudio usando Google Cloud TTS"""
     try:
-        # Configurar cliente TTS
-        os.environ['GOOGLE_APPLICATION_CREDENTIALS_JSON'] = tts_api_key
-        client = texttospeech.TextToSpeechClient()
-        
-        # Obter informações da voz
-        voice_info = get_voice_by_id(voice_id)
-        if not voice_info:
+        # Configurar síntese (parâmetros resolvidos uma vez por voz)
+        voice = get_voice_params(voice_id)
+        if voice is None:
             raise HTTPException(status_code=400, detail=f"Voz {voice_id} não encontrada")
         
-        # Configurar síntese
-        synthesis_input = texttospeech.SynthesisInput(text=text)
+        audio_config = TTS_AUDIO_CONFIG
         
-        voice = texttospeech.VoiceSelectionParams(
-            language_code=voice_info["language_code"],
-            name=voice_id
+        # Mesmo texto + voz + config = mesmo MP3: reaproveita do cache em disco
+        content_key = FileCache.make_key(
+            voice_id,
+            str(audio_config.audio_encoding),
+            str(audio_config.speaking_rate),
+            str(audio_config.pitch),
+            text
         )
+        if await asyncio.to_thread(tts_file_cache.get, content_key, output_path):
+            duration = await asyncio.to_thread(mp3_duration_from_file, output_path)
+            return audio_duration_seconds(duration, text)
         
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,
-            speaking_rate=1.0,
-            pitch=0.0
-        )
+        client = get_tts_client(tts_api_key)
         
-        # Gerar áudio
-        response = client.synthesize_speech(
-            input=synthesis_input,
-            voice=voice,
-            audio_config=audio_config
+        async def synth(chunk: str) -> bytes:
+            # Chamada síncrona do gRPC roda fora do event loop
+            response = await asyncio.to_thread(
+                client.synthesize_speech,
+                input=texttospeech.SynthesisInput(text=chunk),
+                voice=voice,
+                audio_config=audio_config
+            )
+            return response.audio_content
+        
+        async def synthesize() -> bytes:
+            # Textos acima do limite de uma requisição vão para o Long Audio
+            if len(text.encode('utf-8')) > TTS_MAX_CHUNK_BYTES:
+                audio = await synthesize_long_audio(text, voice)
+                if audio is not None:
+                    return audio
+            return await run_tts(split_text_into_chunks(text), synth)
+        
+        # Gerar áudio (Long Audio ou chunks para textos longos); sínteses
+        # idênticas concorrentes compartilham o mesmo resultado
+        audio_content = await tts_inflight.do(
+            generate_cache_key("tts", content=content_key),
+            synthesize
         )
         
-        # Salvar arquivo
-        with open(output_path, "wb") as out:
-            out.write(response.audio_content)
+        # Salvar no cache e no destino (fora do event loop)
+        await asyncio.to_thread(tts_file_cache.put, content_key, audio_content, output_path)
         
-        # Retornar duração aproximada (caracteres / 15 = segundos aproximados)
-        duration = len(text) // 15
-        return duration
+        # Duração lida do cabeçalho do MP3 (ou estimada pelo texto)
+        return audio_duration_seconds(mp3_duration(audio_content), text)
     
     except Exception as e:
         logger.error(f"Erro ao gerar TTS: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro ao gerar TTS: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar TTS: {str(e)}") from e
 
 async def generate_image_with_gemini(
     api_key: str,
@@ -596,12 +1255,121 @@ async def generate_image_with_gemini(
     
     except Exception as e:
         logger.error(f"Erro ao gerar imagem: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro ao gerar imagem: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar imagem: {str(e)}") from e
 
 # =================================================================
 # == BACKGROUND TASKS PARA GERAÇÃO
 # =================================================================
 
+def write_text_file(path: str, content: str):
+    """Grava um arquivo de texto (chamado via asyncio.to_thread nos jobs)"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+# Erros de quota/rate limit das APIs Google (HTTP 429)
+_QUOTA_EXCEPTIONS = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+
+# Último recurso para erros sem tipo nem status (ex.: mensagens de SDK REST);
+# 429 só como número isolado, não dentro de IDs ou tamanhos
+_QUOTA_ERROR_RE = re.compile(r"\b429\b|quota|resource exhausted", re.IGNORECASE)
+
+def is_quota_error(e: Exception) -> bool:
+    """Identifica erros de quota/rate limit (429) do Gemini"""
+    # Os geradores embrulham o erro original em HTTPException(500) ("from e")
+    if isinstance(e, HTTPException) and e.__cause__ is not None:
+        e = e.__cause__
+    if isinstance(e, _QUOTA_EXCEPTIONS):
+        return True
+    if isinstance(e, google_exceptions.GoogleAPICallError):
+        # Erro tipado com outro status: não é quota
+        return e.code == 429
+    if getattr(e, "status_code", None) == 429:
+        return True
+    return _QUOTA_ERROR_RE.search(str(getattr(e, "detail", e))) is not None
+
+async def run_with_workers(
+    items: list,
+    func,
+    num_workers: int = 4,
+    max_retries: int = 3,
+    backoff_seconds: float = 2.0
+) -> list:
+    """
+    Produtor-consumidor: N workers consomem os itens de uma fila. Em erro
+    de quota, o item volta para a fila e todos os workers pausam antes da
+    próxima chamada (backoff exponencial), sem cancelar as que estão em
+    andamento.
+    
+    Args:
+        items: Itens a processar
+        func: Corrotina chamada com cada item
+        num_workers: Máximo de chamadas simultâneas
+        max_retries: Tentativas por item em erro de quota
+        backoff_seconds: Pausa base após um erro de quota
+    
+    Returns:
+        Lista na ordem dos itens com o resultado ou a exceção de cada um
+    """
+    loop = asyncio.get_running_loop()
+    work_queue = asyncio.Queue()
+    for index, item in enumerate(items):
+        work_queue.put_nowait((index, item, 1))
+    
+    results = [None] * len(items)
+    resume_at = 0.0
+    
+    async def worker():
+        nonlocal resume_at
+        while True:
+            try:
+                index, item, attempt = work_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            
+            wait = resume_at - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            
+            try:
+                results[index] = await func(item)
+            except Exception as e:
+                if is_quota_error(e) and attempt < max_retries:
+                    backoff = backoff_seconds * (2 ** (attempt - 1))
+                    resume_at = max(resume_at, loop.time() + backoff)
+                    logger.warning(f"Quota excedida para {item}, nova tentativa em {backoff}s")
+                    work_queue.put_nowait((index, item, attempt + 1))
+                else:
+                    results[index] = e
+    
+    await asyncio.gather(*[worker() for _ in range(min(num_workers, len(items)))])
+    return results
+
+class JobProgress:
+    """
+    Acompanha o progresso de um job: cada etapa atualiza o cache em
+    memória lido pelos endpoints de consulta, e o commit no banco só
+    acontece se o último tiver sido há mais de JOB_FLUSH_INTERVAL_SECONDS.
+    """
+    
+    def __init__(self, db_session: Session, job: models.Job, job_id: str):
+        self.db_session = db_session
+        self.job = job
+        # ID recebido à parte: após um commit, ler job.id expirado faria um
+        # SELECT síncrono no event loop
+        self.job_id = job_id
+        self.last_flush = time.monotonic()
+    
+    async def update(self, progress: int, stage: str):
+        self.job.progress = progress
+        self.job.current_stage = stage
+        job_progress_cache[self.job_id] = (progress, stage)
+        
+        now = time.monotonic()
+        if now - self.last_flush >= JOB_FLUSH_INTERVAL_SECONDS:
+            # Commit fora do event loop (driver síncrono)
+            await asyncio.to_thread(self.db_session.commit)
+            self.last_flush = now
+
 async def process_job_generation(
     job_id: str,
     user_id: int,
@@ -611,150 +1379,177 @@ async def process_job_generation(
 ):
     """Processa a geração de um job em background"""
     try:
-        # Buscar job
-        job = db_session.query(models.Job).filter(models.Job.id == job_id).first()
-        if not job:
+        # Buscar job e agente em uma única consulta
+        row = db_session.query(models.Job, models.Agent).outerjoin(
+            models.Agent, models.Agent.id == agent_id
+        ).filter(models.Job.id == job_id).first()
+        if not row:
             logger.error(f"Job {job_id} não encontrado")
             return
+        job, agent = row
         
-        # Atualizar status
-        job.status = "processing"
-        job.progress = 10
-        db_session.commit()
-        
-        # Buscar agente
-        agent = db_session.query(models.Agent).filter(models.Agent.id == agent_id).first()
         if not agent:
             job.status = "failed"
+            job.current_stage = "done"
             job.log = json.dumps(["Agente não encontrado"])
             db_session.commit()
             return
         
+        # O agente é só leitura no job: desanexado da sessão, os commits de
+        # etapa não expiram seus atributos (nada de recarregar a linha)
+        db_session.expunge(agent)
+        
+        # Atualizar status (troca de status vai direto para o banco)
+        job.status = "processing"
+        job.progress = 10
+        job.current_stage = "script"
+        db_session.commit()
+        with job_queue_cache_lock:
+            job_queue_cache.pop(user_id, None)
+        job_progress = JobProgress(db_session, job, job_id)
+        job_progress_cache[job_id] = (10, "script")  # sem reler o job expirado
+        
+        # Configuração do agente lida uma vez
+        idioma_principal = agent.idioma_principal
+        idiomas_adicionais = list(agent.idiomas_adicionais or [])
+        tts_voices = dict(agent.tts_voices or {}) if agent.tts_enabled else {}
+        
         # Buscar API key do Gemini
-        api_key_obj = db_session.query(models.ApiKey).filter(
-            models.ApiKey.user_id == user_id,
-            models.ApiKey.is_valid == True
-        ).first()
+        api_key = get_valid_key_value(db_session, models.ApiKey, user_id)
         
-        if not api_key_obj:
+        if not api_key:
             job.status = "failed"
+            job.current_stage = "done"
             job.log = json.dumps(["Nenhuma API key válida encontrada"])
             db_session.commit()
             return
         
-        api_key = api_key_obj.key_value
-        
         # Gerar roteiro master
-        job.progress = 20
-        db_session.commit()
-        
         roteiro_master = await generate_script_with_gemini(api_key, agent, titulo)
         job.roteiro_master = roteiro_master
-        job.progress = 40
-        db_session.commit()
+        await job_progress.update(40, "adaptation")
+        
+        # Registros de arquivos gerados acumulados e gravados em um único
+        # INSERT (executemany) no commit final
+        generated_files = []
+        
+        def add_generated_file(filename: str, file_type: str, file_path: str, file_size: int):
+            generated_files.append({
+                "user_id": user_id,
+                "job_id": job_id,
+                "filename": filename,
+                "file_type": file_type,
+                "file_path": file_path,
+                "file_size": file_size,
+            })
         
         # Salvar roteiro master em arquivo
-        script_filename = f"{job_id}_{agent.idioma_principal}.txt"
+        script_filename = f"{job_id}_{idioma_principal}.txt"
         script_path = f"files/scripts/{script_filename}"
-        with open(script_path, "w", encoding="utf-8") as f:
-            f.write(roteiro_master)
+        await asyncio.to_thread(write_text_file, script_path, roteiro_master)
         
         # Registrar arquivo
-        file_record = models.GeneratedFile(
-            user_id=user_id,
-            job_id=job_id,
-            filename=script_filename,
-            file_type="script",
-            file_path=script_path,
-            file_size=len(roteiro_master.encode('utf-8'))
-        )
-        db_session.add(file_record)
+        add_generated_file(script_filename, "script", script_path, len(roteiro_master.encode('utf-8')))
         
-        # Adaptar para idiomas adicionais
-        roteiros_adaptados = {agent.idioma_principal: roteiro_master}
+        # Buscar TTS API key antes das adaptações: o áudio de cada idioma
+        # começa assim que o roteiro correspondente fica pronto
+        tts_api_key = None
+        if tts_voices:
+            tts_api_key = get_valid_key_value(db_session, models.TtsApiKey, user_id)
         
-        if agent.idiomas_adicionais:
-            for idx, idioma in enumerate(agent.idiomas_adicionais):
-                progress = 40 + (idx + 1) * (20 // (len(agent.idiomas_adicionais) + 1))
-                job.progress = progress
-                db_session.commit()
-                
-                roteiro_adaptado = await adapt_script_to_language(
-                    api_key, agent, roteiro_master, idioma
+        # Cada idioma é uma síntese independente: dispara em paralelo
+        tts_semaphore = asyncio.Semaphore(int(os.environ.get("TTS_CONCURRENCY", "4")))
+        tts_tasks = []
+        
+        async def tts_one(idioma: str, roteiro: str):
+            audio_filename = f"{job_id}_{idioma}.mp3"
+            audio_path = os.path.join(AUDIO_DIR, audio_filename)
+            
+            async with tts_semaphore:
+                duration = await generate_tts_audio(
+                    tts_api_key, roteiro, tts_voices[idioma], audio_path
                 )
-                roteiros_adaptados[idioma] = roteiro_adaptado
+            return idioma, audio_filename, audio_path, duration
+        
+        def schedule_tts(idioma: str, roteiro: str):
+            if tts_api_key and idioma in tts_voices:
+                tts_tasks.append(asyncio.create_task(tts_one(idioma, roteiro)))
+        
+        # Daqui até o gather, qualquer saída (erro ou cancelamento) cancela e
+        # aguarda as sínteses pendentes: nenhuma continua gravando arquivos
+        # de um job já marcado como falho
+        try:
+            schedule_tts(idioma_principal, roteiro_master)
+            
+            # Adaptar para idiomas adicionais
+            roteiros_adaptados = {idioma_principal: roteiro_master}
+            
+            job_log = []
+            
+            if idiomas_adicionais:
+                # Adaptações são independentes: workers em paralelo (limitados
+                # e com backoff para respeitar o rate limit do Gemini)
+                # Parte invariável do prompt montada uma vez; com mais de um
+                # idioma, vai uma vez para o cache do Gemini
+                prompt_head = build_adaptation_prompt_head(agent, roteiro_master)
+                script_cache = None
+                if len(idiomas_adicionais) > 1:
+                    script_cache = await create_script_cache(api_key, prompt_head)
                 
-                # Salvar arquivo adaptado
-                adapted_filename = f"{job_id}_{idioma}.txt"
-                adapted_path = f"files/scripts/{adapted_filename}"
-                with open(adapted_path, "w", encoding="utf-8") as f:
-                    f.write(roteiro_adaptado)
+                async def adapt_one(idioma: str) -> str:
+                    roteiro_adaptado = await adapt_script_to_language(
+                        api_key, agent, roteiro_master, idioma, script_cache, prompt_head
+                    )
+                    schedule_tts(idioma, roteiro_adaptado)
+                    return roteiro_adaptado
                 
-                file_record = models.GeneratedFile(
-                    user_id=user_id,
-                    job_id=job_id,
-                    filename=adapted_filename,
-                    file_type="script",
-                    file_path=adapted_path,
-                    file_size=len(roteiro_adaptado.encode('utf-8'))
-                )
-                db_session.add(file_record)
-        
-        job.roteiros_adaptados = roteiros_adaptados
-        job.progress = 60
-        db_session.commit()
+                try:
+                    results = await run_with_workers(idiomas_adicionais, adapt_one, num_workers=4)
+                finally:
+                    if script_cache is not None:
+                        await delete_script_cache(api_key, script_cache)
+                
+                for idioma, roteiro_adaptado in zip(idiomas_adicionais, results):
+                    if isinstance(roteiro_adaptado, Exception):
+                        logger.error(f"Erro ao adaptar job {job_id} para {idioma}: {str(roteiro_adaptado)}")
+                        job_log.append(f"Falha na adaptação para {idioma}: {str(roteiro_adaptado)}")
+                        continue
+                    
+                    roteiros_adaptados[idioma] = roteiro_adaptado
+                    
+                    # Salvar arquivo adaptado
+                    adapted_filename = f"{job_id}_{idioma}.txt"
+                    adapted_path = f"files/scripts/{adapted_filename}"
+                    await asyncio.to_thread(write_text_file, adapted_path, roteiro_adaptado)
+                    
+                    add_generated_file(adapted_filename, "script", adapted_path, len(roteiro_adaptado.encode('utf-8')))
+            
+            job.roteiros_adaptados = roteiros_adaptados
+            if job_log:
+                job.log = json.dumps(job_log)
+            await job_progress.update(60, "tts")
+            
+            # Aguardar os áudios já disparados durante as adaptações
+            results = await asyncio.gather(*tts_tasks)
+        finally:
+            for task in tts_tasks:
+                task.cancel()
+            await asyncio.gather(*tts_tasks, return_exceptions=True)
         
-        # Gerar TTS se habilitado
         audios_gerados = {}
         total_duration = 0
         
-        if agent.tts_enabled and agent.tts_voices:
-            # Buscar TTS API key
-            tts_key_obj = db_session.query(models.TtsApiKey).filter(
-                models.TtsApiKey.user_id == user_id,
-                models.TtsApiKey.is_valid == True
-            ).first()
+        for idioma, audio_filename, audio_path, duration in results:
+            audios_gerados[idioma] = f"/files/audio/{audio_filename}"
+            total_duration += duration
             
-            if tts_key_obj:
-                tts_api_key = tts_key_obj.key_value
-                
-                for idx, (idioma, roteiro) in enumerate(roteiros_adaptados.items()):
-                    if idioma in agent.tts_voices:
-                        voice_id = agent.tts_voices[idioma]
-                        
-                        progress = 60 + (idx + 1) * (30 // len(roteiros_adaptados))
-                        job.progress = progress
-                        db_session.commit()
-                        
-                        audio_filename = f"{job_id}_{idioma}.mp3"
-                        audio_path = f"files/audio/{audio_filename}"
-                        
-                        duration = await generate_tts_audio(
-                            tts_api_key, roteiro, voice_id, audio_path
-                        )
-                        
-                        audios_gerados[idioma] = f"/files/audio/{audio_filename}"
-                        total_duration += duration
-                        
-                        # Registrar arquivo
-                        file_size = os.path.getsize(audio_path) if os.path.exists(audio_path) else 0
-                        file_record = models.GeneratedFile(
-                            user_id=user_id,
-                            job_id=job_id,
-                            filename=audio_filename,
-                            file_type="audio",
-                            file_path=audio_path,
-                            file_size=file_size
-                        )
-                        db_session.add(file_record)
-                        
-                        # Atualizar stats
-                        update_user_stats(db_session, user_id, "tts", 1)
+            # Registrar arquivo
+            file_size = os.path.getsize(audio_path) if os.path.exists(audio_path) else 0
+            add_generated_file(audio_filename, "audio", audio_path, file_size)
         
         job.audios_gerados = audios_gerados
         job.duracao_total_segundos = total_duration
-        job.progress = 90
-        db_session.commit()
+        await job_progress.update(90, "images")
         
         # Gerar imagens se habilitado
         imagens_geradas = []
@@ -775,35 +1570,84 @@ async def process_job_generation(
                 imagens_geradas.append(f"/files/images/{image_filename}")
                 
                 # Registrar arquivo
-                file_record = models.GeneratedFile(
-                    user_id=user_id,
-                    job_id=job_id,
-                    filename=image_filename,
-                    file_type="image",
-                    file_path=image_path,
-                    file_size=0  # Placeholder
-                )
-                db_session.add(file_record)
+                add_generated_file(image_filename, "image", image_path, 0)  # Placeholder
         
         job.imagens_geradas = imagens_geradas
         job.progress = 100
+        job.current_stage = "done"
         job.status = "completed"
-        db_session.commit()
         
-        # Atualizar stats do usuário
-        update_user_stats(db_session, user_id, "script", 1)
-        if total_duration > 0:
-            update_user_stats(db_session, user_id, "audio_duration", total_duration)
+        def finish():
+            # Stats do usuário (roteiro + todos os áudios) no mesmo commit da conclusão
+            update_user_stats(
+                db_session, user_id,
+                scripts=1, tts=len(results), audio_duration=total_duration
+            )
+            if generated_files:
+                db_session.execute(insert(models.GeneratedFile.__table__), generated_files)
+            db_session.commit()
+        
+        await asyncio.to_thread(finish)
         
         logger.info(f"Job {job_id} concluído com sucesso")
     
     except Exception as e:
         logger.error(f"Erro ao processar job {job_id}: {str(e)}")
-        job = db_session.query(models.Job).filter(models.Job.id == job_id).first()
+        # Descarta a transação que falhou (ex.: erro no commit final); sem
+        # isso a consulta abaixo levantaria PendingRollbackError
+        db_session.rollback()
+        # Só a linha é necessária para marcar a falha, não os resultados parciais
+        job = db_session.query(models.Job).options(
+            load_only(models.Job.id, models.Job.status)
+        ).filter(models.Job.id == job_id).first()
         if job:
             job.status = "failed"
+            job.current_stage = "done"
             job.log = json.dumps([f"Erro: {str(e)}"])
             db_session.commit()
+    
+    finally:
+        # Toda saída (conclusão, retorno antecipado ou erro) encerra o
+        # progresso em memória e a fila em cache do usuário
+        job_progress_cache.pop(job_id, None)
+        with job_queue_cache_lock:
+            job_queue_cache.pop(user_id, None)
+
+
+async def process_jobs_concurrently(
+    job_specs: List[tuple],
+    user_id: int,
+    agent_id: int,
+    max_concurrent_jobs: int = 2
+):
+    """
+    Processa vários jobs em paralelo, cada um com sua própria sessão.
+    O limite de jobs simultâneos evita multiplicar as chamadas concorrentes
+    de LLM/TTS que cada job já faz internamente.
+    
+    Args:
+        job_specs: Lista de (job_id, titulo)
+        user_id: ID do usuário
+        agent_id: ID do agente
+        max_concurrent_jobs: Máximo de jobs processando ao mesmo tempo
+    """
+    semaphore = asyncio.Semaphore(max_concurrent_jobs)
+    
+    async def run_one(job_id: str, titulo: str):
+        async with semaphore:
+            db_session = SessionLocal()
+            try:
+                await process_job_generation(job_id, user_id, agent_id, titulo, db_session)
+            except Exception:
+                # A falha de um job (ex.: ao marcá-lo como failed) não pode
+                # chegar ao TaskGroup, que cancelaria os outros jobs
+                logger.exception(f"Falha não tratada no job {job_id}")
+            finally:
+                db_session.close()
+    
+    async with asyncio.TaskGroup() as tg:
+        for job_id, titulo in job_specs:
+            tg.create_task(run_one(job_id, titulo))
 
 
 # =================================================================
@@ -811,20 +1655,16 @@ async def process_job_generation(
 # =================================================================
 
 @app.post("/jobs/generate", response_model=List[schemas.JobResponse])
-async def create_generation_jobs(
+def create_generation_jobs(
     job_data: schemas.JobCreate,
     background_tasks: BackgroundTasks,
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Cria jobs de geração para múltiplos títulos"""
-    jobs = []
-    
-    for titulo in job_data.titulos:
-        # Criar job
-        job_id = str(uuid.uuid4())
-        new_job = models.Job(
-            id=job_id,
+    jobs = [
+        models.Job(
+            id=str(uuid.uuid4()),
             user_id=current_user.id,
             agent_id=job_data.agent_id,
             titulo=titulo,
@@ -832,44 +1672,86 @@ async def create_generation_jobs(
             progress=0,
             log=json.dumps(["Job criado"])
         )
-        db.add(new_job)
-        db.commit()
-        db.refresh(new_job)
-        
-        # Adicionar tarefa em background
+        for titulo in job_data.titulos
+    ]
+    
+    # Um único commit para todos os jobs e um único SELECT para recarregá-los
+    # (em vez de commit + refresh por título)
+    db.add_all(jobs)
+    db.commit()
+    with job_queue_cache_lock:
+        job_queue_cache.pop(current_user.id, None)
+    db.query(models.Job).filter(models.Job.id.in_([job.id for job in jobs])).all()
+    
+    job_specs = [(job.id, job.titulo) for job in jobs]
+    if settings.USE_CELERY_WORKER:
+        # Geração roda nos workers Celery, fora dos workers HTTP
+        from celery_tasks import generate_jobs_task
+        generate_jobs_task.delay(job_specs, current_user.id, job_data.agent_id)
+    else:
+        # Uma única tarefa em background processa os títulos em paralelo
         background_tasks.add_task(
-            process_job_generation,
-            job_id,
+            process_jobs_concurrently,
+            job_specs,
             current_user.id,
-            job_data.agent_id,
-            titulo,
-            db
+            job_data.agent_id
         )
-        
-        jobs.append(new_job)
     
     return jobs
 
+# Colunas de jobs que compõem JobResponse (mesmos nomes dos campos)
+JOB_RESPONSE_COLUMNS = [
+    models.Job.__table__.c[name] for name in schemas.JobResponse.model_fields
+]
+
 @app.get("/jobs/queue", response_model=List[schemas.JobResponse])
 def get_job_queue(
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Retorna a fila de jobs do usuário"""
-    jobs = db.query(models.Job).filter(
-        models.Job.user_id == current_user.id
-    ).order_by(models.Job.created_at.desc()).limit(50).all()
+    with job_queue_cache_lock:
+        rows = job_queue_cache.get(current_user.id)
+    if rows is None:
+        # Só as colunas de JobResponse: os roteiros e áudios de cada job
+        # não saem do banco (tupla: a lista em cache é lida por várias threads)
+        rows = tuple(db.execute(
+            select(*JOB_RESPONSE_COLUMNS)
+            .where(models.Job.user_id == current_user.id)
+            .order_by(models.Job.created_at.desc())
+            .limit(50)
+        ).mappings().all())
+        with job_queue_cache_lock:
+            job_queue_cache[current_user.id] = rows
     
-    return jobs
+    # Jobs em andamento: progresso e etapa mais recentes vêm do cache em memória
+    responses = []
+    for row in rows:
+        progress, stage = job_progress_cache.get(row["id"], (row["progress"], row["current_stage"]))
+        responses.append(schemas.JobResponse.model_construct(
+            **{**row, "progress": progress, "current_stage": stage}
+        ))
+    return responses
 
 @app.get("/jobs/{job_id}", response_model=schemas.JobDetailResponse)
 def get_job_detail(
     job_id: str,
-    current_user: models.User = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    include_result: bool = False,
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Retorna detalhes de um job específico"""
-    job = db.query(models.Job).filter(
+    """
+    Retorna detalhes de um job específico. Roteiros e áudios só vêm com
+    include_result=true; o polling de status recebe apenas os campos leves.
+    """
+    # Os resultados são colunas adiadas no modelo: só vêm no mesmo SELECT
+    # quando pedidos
+    query = db.query(models.Job)
+    if include_result:
+        query = query.options(undefer_group("results"))
+    job = query.filter(
         models.Job.id == job_id,
         models.Job.user_id == current_user.id
     ).first()
@@ -877,21 +1759,30 @@ def get_job_detail(
     if not job:
         raise HTTPException(status_code=404, detail="Job não encontrado")
     
+    # Polling: se nada mudou desde a última resposta, 304 sem corpo
+    progress, stage = job_progress_cache.get(job.id, (job.progress, job.current_stage))
+    updated_at = job.updated_at.timestamp() if job.updated_at else 0
+    etag = f'W/"{job.status}-{progress}-{updated_at}-{len(job.log or "")}-{int(include_result)}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
     # Parsear log
     try:
-        log_list = json.loads(job.log) if job.log else []
+        log_list = orjson.loads(job.log) if job.log else []
     except:
         log_list = []
     
-    return schemas.JobDetailResponse(
+    return schemas.JobDetailResponse.model_construct(
         id=job.id,
         status=job.status,
-        progress=job.progress,
+        progress=progress,
+        current_stage=stage,
         titulo=job.titulo,
         log=log_list,
-        roteiro_master=job.roteiro_master,
-        roteiros_adaptados=job.roteiros_adaptados,
-        audios_gerados=job.audios_gerados,
+        roteiro_master=job.roteiro_master if include_result else None,
+        roteiros_adaptados=job.roteiros_adaptados if include_result else None,
+        audios_gerados=job.audios_gerados if include_result else None,
         imagens_geradas=job.imagens_geradas,
         video_gerado=job.video_gerado,
         created_at=job.created_at,
@@ -901,11 +1792,13 @@ def get_job_detail(
 @app.post("/jobs/{job_id}/cancel")
 def cancel_job(
     job_id: str,
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Cancela um job em andamento"""
-    job = db.query(models.Job).filter(
+    job = db.query(models.Job).options(
+        load_only(models.Job.id, models.Job.status)
+    ).filter(
         models.Job.id == job_id,
         models.Job.user_id == current_user.id
     ).first()
@@ -918,6 +1811,8 @@ def cancel_job(
     
     job.status = "cancelled"
     db.commit()
+    with job_queue_cache_lock:
+        job_queue_cache.pop(current_user.id, None)
     
     return {"success": True, "message": "Job cancelado com sucesso"}
 
@@ -927,7 +1822,7 @@ def cancel_job(
 
 @app.get("/stats/dashboard", response_model=schemas.UserStatsResponse)
 def get_user_stats(
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Retorna estatísticas do dashboard do usuário"""
@@ -950,7 +1845,7 @@ def get_user_stats(
 
 @app.get("/files/recent", response_model=List[schemas.GeneratedFileResponse])
 def get_recent_files(
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Retorna arquivos gerados nas últimas 24 horas"""
@@ -962,7 +1857,7 @@ def get_recent_files(
     ).order_by(models.GeneratedFile.created_at.desc()).all()
     
     return [
-        schemas.GeneratedFileResponse(
+        schemas.GeneratedFileResponse.model_construct(
             id=f.id,
             filename=f.filename,
             file_type=f.file_type,
@@ -973,10 +1868,10 @@ def get_recent_files(
         for f in files
     ]
 
-@app.delete("/files/{file_id}")
+@app.delete("/files/{file_id}", status_code=204)
 def delete_file(
     file_id: int,
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Deleta um arquivo gerado"""
@@ -999,7 +1894,7 @@ def delete_file(
     db.delete(file_record)
     db.commit()
     
-    return {"success": True, "message": "Arquivo deletado com sucesso"}
+    return Response(status_code=204)
 
 # =================================================================
 # == ENDPOINTS DE CRIAÇÃO DE AGENTE COM IA
@@ -1009,7 +1904,7 @@ def delete_file(
 async def create_agent_with_ai(
     agent_name: str = Form(...),
     files: List[UploadFile] = File(...),
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Cria um agente a partir da análise de roteiros com IA"""
@@ -1028,17 +1923,13 @@ async def create_agent_with_ai(
             scripts_content.append(content.decode('utf-8'))
         
         # Buscar API key
-        api_key_obj = db.query(models.ApiKey).filter(
-            models.ApiKey.user_id == current_user.id,
-            models.ApiKey.is_valid == True
-        ).first()
+        api_key = get_valid_key_value(db, models.ApiKey, current_user.id)
         
-        if not api_key_obj:
+        if not api_key:
             raise HTTPException(status_code=400, detail="Nenhuma API key válida encontrada")
         
-        # Configurar Gemini
-        genai.configure(api_key=api_key_obj.key_value)
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        # Cliente Gemini da chave do usuário
+        model = bind_gemini_model(genai.GenerativeModel(GEMINI_MODEL), get_gemini_clients(api_key))
         
         # Criar prompt de análise
         analysis_prompt = f"""
@@ -1056,7 +1947,7 @@ Com base nesses roteiros, gere:
 Retorne em formato JSON com as chaves: premise_template, script_template, block_structure, cultural_adaptation_template
 """
         
-        response = model.generate_content(analysis_prompt)
+        response = await model.generate_content_async(analysis_prompt)
         
         # Tentar parsear resposta como JSON
         try:
@@ -4,7 +4,7 @@ Script para criar/atualizar tabelas do banco de dados.
 """
 import sys
 import logging
-from sqlalchemy import inspect
+from sqlalchemy import delete, func, inspect, select, text
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -15,6 +15,16 @@ from database import engine, Base
 import models
 import models_batch
 
+def get_existing_tables() -> set:
+    """
+    Lista as tabelas existentes no banco em uma única consulta.
+    
+    Returns:
+        Conjunto com os nomes das tabelas
+    """
+    return set(inspect(engine).get_table_names())
+
+
 def check_table_exists(table_name: str) -> bool:
     """
     Verifica se uma tabela existe no banco.
@@ -25,8 +35,136 @@ def check_table_exists(table_name: str) -> bool:
     Returns:
         True se existe, False caso contrário
     """
+    return table_name in get_existing_tables()
+
+
+def create_missing_columns():
+    """
+    Adiciona as colunas declaradas nos modelos que ainda não existem
+    (create_all não altera tabelas já criadas).
+    
+    Pode rodar ao mesmo tempo em vários processos (ex.: workers do uvicorn
+    subindo juntos): uma coluna criada por outro processo conta como sucesso.
+    """
     inspector = inspect(engine)
-    return table_name in inspector.get_table_names()
+    existing_tables = get_existing_tables()
+    
+    for table_name, table in Base.metadata.tables.items():
+        if table_name not in existing_tables:
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table_name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            try:
+                # Uma transação por coluna: no Postgres um ALTER que falha
+                # invalidaria as demais
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}"))
+            except Exception:
+                current = {col["name"] for col in inspect(engine).get_columns(table_name)}
+                if column.name not in current:
+                    raise
+                logger.info(f"✓ Coluna já criada por outro processo: {table_name}.{column.name}")
+                continue
+            logger.info(f"✓ Coluna criada: {table_name}.{column.name}")
+
+
+# Tabelas cujas linhas duplicadas podem ser apagadas antes de criar um
+# índice único (nenhuma outra tabela as referencia)
+DEDUPLICATE_BEFORE_UNIQUE_INDEX = {"api_key_pool"}
+
+
+def remove_duplicate_rows(table, columns) -> int:
+    """
+    Apaga as linhas repetidas nas colunas de um índice único, mantendo a de
+    menor id (ex.: a mesma key duas vezes no api_key_pool, de antes da
+    restrição), para que o índice possa ser criado.
+    
+    Returns:
+        Quantidade de linhas apagadas
+    """
+    keep = select(func.min(table.c.id)).group_by(*columns)
+    with engine.begin() as conn:
+        result = conn.execute(delete(table).where(table.c.id.not_in(keep)))
+    return result.rowcount
+
+
+def create_missing_indexes():
+    """
+    Cria os índices declarados nos modelos que ainda não existem
+    (create_all só cria índices junto com tabelas novas). Antes de um
+    índice único nas tabelas de DEDUPLICATE_BEFORE_UNIQUE_INDEX, remove as
+    duplicatas que o impediriam.
+    """
+    inspector = inspect(engine)
+    existing_tables = get_existing_tables()
+    
+    for table_name, table in Base.metadata.tables.items():
+        if table_name not in existing_tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table_name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                if index.unique and table_name in DEDUPLICATE_BEFORE_UNIQUE_INDEX:
+                    removed = remove_duplicate_rows(table, index.columns)
+                    if removed:
+                        logger.warning(f"⚠ {removed} linha(s) duplicada(s) removida(s) de {table_name} para o índice {index.name}")
+                index.create(bind=engine)
+                logger.info(f"✓ Índice criado: {index.name}")
+
+
+# Colunas JSON convertidas para JSONB no Postgres e índices GIN sobre elas
+JSONB_COLUMNS = {
+    "agents": ["idiomas_adicionais", "tts_voices", "visual_media_config"],
+    "jobs": ["roteiros_adaptados", "audios_gerados", "imagens_geradas"],
+    "batches": ["metadata_config"],
+}
+GIN_INDEXES = {
+    "ix_jobs_audios_gerados": ("jobs", "audios_gerados"),
+    "ix_batch_metadata_gin": ("batches", "metadata_config"),
+}
+
+
+def migrate_jsonb_columns():
+    """
+    Converte as colunas JSON para JSONB, aplica os defaults declarados
+    no modelo e cria os índices GIN (somente Postgres; nos demais bancos
+    não faz nada).
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    
+    inspector = inspect(engine)
+    existing_tables = get_existing_tables()
+    
+    with engine.begin() as conn:
+        for table_name, column_names in JSONB_COLUMNS.items():
+            if table_name not in existing_tables:
+                continue
+            types = {col["name"]: str(col["type"]).upper() for col in inspector.get_columns(table_name)}
+            for column_name in column_names:
+                if types.get(column_name) == "JSON":
+                    conn.execute(text(
+                        f"ALTER TABLE {table_name} ALTER COLUMN {column_name} "
+                        f"TYPE JSONB USING {column_name}::jsonb"
+                    ))
+                    logger.info(f"✓ Coluna convertida para JSONB: {table_name}.{column_name}")
+                
+                server_default = Base.metadata.tables[table_name].c[column_name].server_default
+                if server_default is not None:
+                    conn.execute(text(
+                        f"ALTER TABLE {table_name} ALTER COLUMN {column_name} "
+                        f"SET DEFAULT {server_default.arg.text}::jsonb"
+                    ))
+        
+        for index_name, (table_name, column_name) in GIN_INDEXES.items():
+            if table_name in existing_tables:
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} "
+                    f"ON {table_name} USING gin ({column_name})"
+                ))
 
 
 def create_tables():
@@ -37,19 +175,20 @@ def create_tables():
     logger.info("MIGRAÇÃO DO BANCO DE DADOS - BOLT IA")
     logger.info("=" * 80)
     
-    # Listar todas as tabelas que serão criadas
-    tables_to_create = []
+    # Listar todas as tabelas que serão criadas (uma consulta ao banco)
+    existing_tables = get_existing_tables()
+    new_tables = []
     
-    for table_name, table in Base.metadata.tables.items():
-        exists = check_table_exists(table_name)
+    for table_name in Base.metadata.tables:
+        exists = table_name in existing_tables
         status = "✓ Já existe" if exists else "⚠ Será criada"
-        tables_to_create.append((table_name, exists))
+        if not exists:
+            new_tables.append(table_name)
         logger.info(f"{status}: {table_name}")
     
     logger.info("-" * 80)
     
     # Perguntar confirmação
-    new_tables = [name for name, exists in tables_to_create if not exists]
     
     if new_tables:
         logger.info(f"Serão criadas {len(new_tables)} novas tabelas:")
@@ -72,16 +211,21 @@ def create_tables():
             # Verificar novamente
             logger.info("-" * 80)
             logger.info("Verificação pós-migração:")
+            existing_tables = get_existing_tables()
             for table_name in new_tables:
-                exists = check_table_exists(table_name)
-                status = "✓" if exists else "✗"
+                status = "✓" if table_name in existing_tables else "✗"
                 logger.info(f"{status} {table_name}")
             
         except Exception as e:
             logger.error(f"❌ Erro ao criar tabelas: {e}")
             sys.exit(1)
     else:
-        logger.info("✅ Todas as tabelas já existem. Nenhuma migração necessária.")
+        logger.info("✅ Todas as tabelas já existem.")
+    
+    # Colunas e índices novos em tabelas já existentes
+    create_missing_columns()
+    create_missing_indexes()
+    migrate_jsonb_columns()
     
     logger.info("=" * 80)
 
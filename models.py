@@ -1,9 +1,15 @@
 # models.py - Modelos do Banco de Dados para BoredFy AI
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Date, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Date, JSON, ForeignKey, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from database import Base
 
+# JSON binário no Postgres (armazenado já parseado e indexável por GIN);
+# JSON comum nos demais bancos
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
 class User(Base):
     """Modelo de usuário com autenticação"""
     __tablename__ = "users"
@@ -59,17 +65,20 @@ class Agent(Base):
     block_structure = Column(Text, nullable=False)
     cultural_adaptation_prompt = Column(Text, nullable=True)
     
+    # Colunas JSON com default no banco ('[]'/'{}'): nenhum objeto Python
+    # é criado nem serializado no INSERT quando o valor não é informado
+    
     # Idiomas adicionais
-    idiomas_adicionais = Column(JSON, default=list)  # ["en-US", "es-ES"]
+    idiomas_adicionais = Column(JSONType, server_default=text("'[]'"))  # ["en-US", "es-ES"]
     
     # Configuração de TTS
     tts_enabled = Column(Boolean, default=False)
-    tts_voices = Column(JSON, default=dict)  # {"pt-BR": "pt-BR-Neural2-A", "en-US": "en-US-Neural2-D"}
+    tts_voices = Column(JSONType, server_default=text("'{}'"))  # {"pt-BR": "pt-BR-Neural2-A", "en-US": "en-US-Neural2-D"}
     
     # Configuração de Mídia Visual
     visual_media_enabled = Column(Boolean, default=False)
     visual_media_type = Column(String, nullable=True)  # "images" ou "video"
-    visual_media_config = Column(JSON, default=dict)  # Configurações específicas
+    visual_media_config = Column(JSONType, server_default=text("'{}'"))  # Configurações específicas
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -85,16 +94,18 @@ class Job(Base):
     
     status = Column(String, default="pending")  # pending, processing, completed, cancelled, failed
     progress = Column(Integer, default=0)  # 0-100
+    current_stage = Column(String(64), default="pending")  # pending, script, adaptation, tts, images, done
     
     # Dados do job
     titulo = Column(Text, nullable=True)
     log = Column(Text, default="[]")  # JSON array de mensagens de log
     
-    # Resultados
-    roteiro_master = Column(Text, nullable=True)
-    roteiros_adaptados = Column(JSON, nullable=True)  # {"pt-BR": "...", "en-US": "..."}
-    audios_gerados = Column(JSON, nullable=True)  # {"pt-BR": "/files/audio/xxx.mp3"}
-    imagens_geradas = Column(JSON, nullable=True)  # ["/files/images/xxx.png", ...]
+    # Resultados (grupo "results": só carregados quando acessados ou com
+    # undefer_group("results"); o polling lê apenas o cabeçalho do job)
+    roteiro_master = deferred(Column(Text, nullable=True), group="results")
+    roteiros_adaptados = deferred(Column(JSONType, nullable=True), group="results")  # {"pt-BR": "...", "en-US": "..."}
+    audios_gerados = deferred(Column(JSONType, nullable=True), group="results")  # {"pt-BR": "/files/audio/xxx.mp3"}
+    imagens_geradas = Column(JSONType, nullable=True)  # ["/files/images/xxx.png", ...]
     video_gerado = Column(String, nullable=True)  # "/files/videos/xxx.mp4"
     
     # Métricas
@@ -103,6 +114,11 @@ class Job(Base):
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    # Fila de jobs do usuário: filtro por user_id já na ordem de created_at
+    __table_args__ = (
+        Index("ix_jobs_user_created", user_id, created_at.desc()),
+    )
 
 
 class UserStats(Base):
@@ -164,3 +180,8 @@ class GeneratedFile(Base):
     file_size = Column(Integer, nullable=True)  # bytes
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Arquivos recentes do usuário (filtro por user_id + janela de created_at)
+    __table_args__ = (
+        Index("ix_generated_files_user_created", user_id, created_at.desc()),
+    )
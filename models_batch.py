@@ -2,8 +2,10 @@
 """
 Modelos de dados para processamento em lote.
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, func, JSON, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, func, ForeignKey, Float, Index, text
+from sqlalchemy.orm import deferred
 from database import Base
+from models import JSONType
 
 class Batch(Base):
     """
@@ -12,7 +14,7 @@ class Batch(Base):
     __tablename__ = "batches"
     
     id = Column(String, primary_key=True, index=True)  # UUID
-    owner_email = Column(String, index=True, nullable=False)
+    owner_email = Column(String, nullable=False)
     
     # Modo operacional
     mode = Column(String(20), nullable=False)  # 'expand_languages', 'expand_titles', 'matrix'
@@ -37,11 +39,16 @@ class Batch(Base):
     completed_at = Column(DateTime(timezone=True), nullable=True)
     
     # Metadados (guarda configuração original)
-    metadata_config = Column(JSON, nullable=True)  # {titles, languages, agent_id, num_variations}
+    metadata_config = Column(JSONType, nullable=True)  # {titles, languages, agent_id, num_variations}
     
     # Custos estimados
     estimated_cost_usd = Column(Float, nullable=True)
     actual_cost_usd = Column(Float, nullable=True)
+    
+    # Listagem de batches do usuário já na ordem de created_at
+    __table_args__ = (
+        Index("ix_batches_owner_created", owner_email, created_at.desc()),
+    )
 
 
 class BatchJob(Base):
@@ -52,8 +59,8 @@ class BatchJob(Base):
     __tablename__ = "batch_jobs"
     
     id = Column(String, primary_key=True, index=True)  # UUID
-    batch_id = Column(String, ForeignKey('batches.id'), nullable=False, index=True)
-    owner_email = Column(String, index=True, nullable=False)
+    batch_id = Column(String, ForeignKey('batches.id'), nullable=False)
+    owner_email = Column(String, nullable=False)
     
     # Configuração do job
     agent_id = Column(Integer, ForeignKey('agents.id'), nullable=True)
@@ -66,7 +73,9 @@ class BatchJob(Base):
     status = Column(String(20), default="queued", index=True)  # queued, running, completed, failed, retrying
     
     # Resultados
-    roteiro_text = Column(Text, nullable=True)  # Conteúdo inline (opcional)
+    # Legado: o roteiro fica no S3 (roteiro_url) e não é mais gravado aqui;
+    # adiado para que nenhuma consulta de jobs leia o texto
+    roteiro_text = deferred(Column(Text, nullable=True))
     roteiro_url = Column(String(500), nullable=True)  # S3 URL
     audio_url = Column(String(500), nullable=True)  # S3 URL
     
@@ -90,7 +99,18 @@ class BatchJob(Base):
     completed_at = Column(DateTime(timezone=True), nullable=True)
     
     # Cache key (para reutilização)
-    cache_key = Column(String(64), nullable=True, index=True)  # SHA256 hash
+    cache_key = Column(String(64), nullable=True)  # blake2b (256 bits, hex)
+    
+    # Contagem por status dentro do batch, jobs do usuário por data e busca
+    # de resultado reaproveitável (cache_key + status "completed")
+    __table_args__ = (
+        Index("ix_batch_jobs_batch_status", batch_id, status),
+        Index("ix_batch_jobs_owner_created", owner_email, created_at.desc()),
+        Index(
+            "ix_batch_jobs_cachekey_status", cache_key, status,
+            postgresql_where=text("cache_key IS NOT NULL")
+        ),
+    )
 
 
 class ApiKeyPool(Base):
@@ -102,7 +122,7 @@ class ApiKeyPool(Base):
     id = Column(Integer, primary_key=True, index=True)
     owner_email = Column(String, index=True, nullable=False)
     service = Column(String(50), nullable=False)  # 'gemini', 'tts'
-    api_key = Column(String(500), nullable=False)
+    api_key = Column(String(500), nullable=False, unique=True, index=True)
     
     # Status
     is_active = Column(Integer, default=1)  # 1 = ativo, 0 = desativado
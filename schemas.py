@@ -90,6 +90,16 @@ class AgentResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class AgentSummary(BaseModel):
+    """Versão leve do agente para listagens (sem os prompts)"""
+    id: int
+    name: str
+    agent_type: str
+    idioma_principal: str
+    
+    class Config:
+        from_attributes = True
+
 # ===== Job Schemas =====
 class JobCreate(BaseModel):
     agent_id: int
@@ -99,6 +109,7 @@ class JobResponse(BaseModel):
     id: str
     status: str
     progress: int
+    current_stage: Optional[str] = None
     titulo: Optional[str]
     created_at: datetime
     
@@ -109,6 +120,7 @@ class JobDetailResponse(BaseModel):
     id: str
     status: str
     progress: int
+    current_stage: Optional[str] = None
     titulo: Optional[str]
     log: List[str]
     roteiro_master: Optional[str]
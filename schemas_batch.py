@@ -2,10 +2,23 @@
 """
 Schemas Pydantic para validação de requisições de batch.
 """
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Dict, Any
+import re
+from pydantic import BaseModel, Field, StringConstraints, TypeAdapter, ValidationError, validator
+from typing import Annotated, List, Optional, Dict, Any
 from datetime import datetime
 
+# Idioma BCP-47 simplificado: pt-BR, en-US, cmn-CN...
+_LANGUAGE_CODE_RE = re.compile(r"^[A-Za-z]{2,3}(-[A-Za-z0-9]{2,8})?$")
+
+TITLE_MIN_LENGTH = 3
+TITLE_MAX_LENGTH = 500
+MAX_TITLES_PER_BATCH = 1000
+
+# Limites dos títulos checados pelo pydantic-core, sem laço em Python
+TITLES_ADAPTER = TypeAdapter(
+    List[Annotated[str, StringConstraints(min_length=TITLE_MIN_LENGTH, max_length=TITLE_MAX_LENGTH)]]
+)
+
 # ============================================================================
 # SCHEMAS DE ENTRADA (Requisições)
 # ============================================================================
@@ -17,7 +30,7 @@ class LanguageVoiceConfig(BaseModel):
     
     @validator('code')
     def validate_language_code(cls, v):
-        if len(v) < 2 or len(v) > 10:
+        if not _LANGUAGE_CODE_RE.match(v):
             raise ValueError("Código de idioma inválido")
         return v
 
@@ -28,7 +41,7 @@ class BatchCreateRequest(BaseModel):
     agent_id: int = Field(..., description="ID do agente a ser usado")
     
     # Modo expand_languages: 1 título × N idiomas
-    title: Optional[str] = Field(None, min_length=3, max_length=500)
+    title: Optional[str] = Field(None, min_length=TITLE_MIN_LENGTH, max_length=TITLE_MAX_LENGTH)
     language_voices: Optional[List[LanguageVoiceConfig]] = None
     
     # Modo expand_titles: N títulos × 1 idioma
@@ -53,11 +66,13 @@ class BatchCreateRequest(BaseModel):
         if v is not None:
             if len(v) == 0:
                 raise ValueError("Lista de títulos não pode estar vazia")
-            if len(v) > 1000:
-                raise ValueError("Máximo de 1000 títulos por batch")
-            for title in v:
-                if len(title) < 3 or len(title) > 500:
-                    raise ValueError(f"Título inválido: {title}")
+            if len(v) > MAX_TITLES_PER_BATCH:
+                raise ValueError(f"Máximo de {MAX_TITLES_PER_BATCH} títulos por batch")
+            try:
+                TITLES_ADAPTER.validate_python(v)
+            except ValidationError as e:
+                index = e.errors()[0]["loc"][0]
+                raise ValueError(f"Título inválido: {v[index]}")
         return v
     
     class Config:
@@ -42,6 +42,11 @@ async function apiRequest(endpoint, options = {}) {
         throw new Error(error.detail || 'Erro na requisição');
     }
     
+    // 204 No Content (exclusões) não tem corpo
+    if (response.status === 204) {
+        return null;
+    }
+    
     return response.json();
 }
 
@@ -148,6 +153,10 @@ async function getAgents() {
     return await apiRequest('/agents');
 }
 
+async function getAgentsSummary() {
+    return await apiRequest('/agents/summary');
+}
+
 async function getAgent(agentId) {
     return await apiRequest(`/agents/${agentId}`);
 }
@@ -213,7 +222,7 @@ async function getJobQueue() {
 }
 
 async function getJobDetail(jobId) {
-    return await apiRequest(`/jobs/${jobId}`);
+    return await apiRequest(`/jobs/${jobId}?include_result=true`);
 }
 
 async function cancelJob(jobId) {
@@ -309,7 +318,7 @@ async function loadApiKeys() {
 
 async function loadAgents() {
     try {
-        const agents = await getAgents();
+        const agents = await getAgentsSummary();
         const select = document.getElementById('agent-select');
         
         if (!select) return;
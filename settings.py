@@ -6,6 +6,15 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "boredfy-super-secret-key-2025-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # 24 horas
+    # Long Audio TTS (textos longos em uma única requisição, saída no GCS)
+    GCP_PROJECT_ID: str = ""
+    GCP_LOCATION: str = "global"
+    TTS_LONG_AUDIO_BUCKET: str = ""
+    # Desligado por padrão: o Long Audio só gera LINEAR16 (WAV), convertido
+    # para MP3 com ffmpeg, que precisa estar instalado no servidor
+    TTS_LONG_AUDIO_ENABLED: bool = False
+    # Geração de jobs em workers Celery (senão roda no processo da API)
+    USE_CELERY_WORKER: bool = False
 
     class Config:
         env_file = ".env"
@@ -2,14 +2,38 @@
 """
 Script para configurar API keys no pool.
 """
+import io
 import sys
+import csv
 import logging
-from database import SessionLocal
+from typing import List, Dict, Any
+from sqlalchemy import case, func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only, sessionmaker
+from database import create_cli_engine, session_scope
 import models_batch
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sessões do CLI sem pool de conexões (ver database.create_cli_engine)
+CliSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=create_cli_engine())
+
+# Colunas exibidas por list_api_keys (timestamps não são carregados)
+API_KEY_LIST_COLUMNS = (
+    models_batch.ApiKeyPool.id,
+    models_batch.ApiKeyPool.service,
+    models_batch.ApiKeyPool.owner_email,
+    models_batch.ApiKeyPool.api_key,
+    models_batch.ApiKeyPool.is_active,
+    models_batch.ApiKeyPool.total_requests,
+    models_batch.ApiKeyPool.failed_requests,
+    models_batch.ApiKeyPool.requests_per_minute,
+)
+
+# Linhas buscadas por vez ao listar o pool
+API_KEY_LIST_BATCH_SIZE = 500
+
 
 def add_api_key(owner_email: str, service: str, api_key: str, requests_per_minute: int = 60):
     """
@@ -21,71 +45,112 @@ def add_api_key(owner_email: str, service: str, api_key: str, requests_per_minut
         api_key: A API key
         requests_per_minute: Limite de requisições por minuto
     """
-    db = SessionLocal()
+    try:
+        with session_scope(CliSessionLocal) as db:
+            # Criar nova entrada (duplicatas barradas pelo índice único)
+            key_entry = models_batch.ApiKeyPool(
+                owner_email=owner_email,
+                service=service,
+                api_key=api_key,
+                is_active=1,
+                requests_per_minute=requests_per_minute
+            )
+            
+            db.add(key_entry)
+            db.flush()
+            key_id = key_entry.id
+        
+        logger.info(f"✅ API key adicionada ao pool (ID: {key_id}, Service: {service})")
+        
+    except IntegrityError:
+        logger.warning("API key já existe no pool")
+    except Exception as e:
+        logger.error(f"❌ Erro ao adicionar API key: {e}")
+
+
+def add_api_keys_bulk(entries: List[Dict[str, Any]]):
+    """
+    Adiciona várias API keys ao pool com uma consulta de existência e um
+    único INSERT (executemany), em vez de um round-trip por key.
     
+    Args:
+        entries: Lista de {"owner_email", "service", "api_key", "requests_per_minute" (opcional)}
+    """
     try:
-        # Verificar se já existe
-        existing = db.query(models_batch.ApiKeyPool).filter(
-            models_batch.ApiKeyPool.api_key == api_key
-        ).first()
-        
-        if existing:
-            logger.warning(f"API key já existe no pool (ID: {existing.id})")
-            return
-        
-        # Criar nova entrada
-        key_entry = models_batch.ApiKeyPool(
-            owner_email=owner_email,
-            service=service,
-            api_key=api_key,
-            is_active=1,
-            requests_per_minute=requests_per_minute
-        )
-        
-        db.add(key_entry)
-        db.commit()
-        db.refresh(key_entry)
-        
-        logger.info(f"✅ API key adicionada ao pool (ID: {key_entry.id}, Service: {service})")
+        with session_scope(CliSessionLocal) as db:
+            # Keys já no pool (uma consulta só)
+            api_keys = {entry["api_key"] for entry in entries}
+            existing = {
+                api_key for (api_key,) in db.query(models_batch.ApiKeyPool.api_key).filter(
+                    models_batch.ApiKeyPool.api_key.in_(api_keys)
+                )
+            }
+            
+            rows = []
+            for entry in entries:
+                if entry["api_key"] in existing:
+                    continue
+                existing.add(entry["api_key"])  # Duplicatas dentro da própria lista
+                rows.append({
+                    "owner_email": entry["owner_email"],
+                    "service": entry["service"],
+                    "api_key": entry["api_key"],
+                    "is_active": 1,
+                    "requests_per_minute": int(entry.get("requests_per_minute") or 60)
+                })
+            
+            if rows:
+                db.execute(insert(models_batch.ApiKeyPool.__table__), rows)
+        
+        logger.info(f"✅ {len(rows)} API keys adicionadas ao pool ({len(entries) - len(rows)} já existentes ou repetidas)")
         
     except Exception as e:
-        logger.error(f"❌ Erro ao adicionar API key: {e}")
-        db.rollback()
-    finally:
-        db.close()
+        logger.error(f"❌ Erro ao adicionar API keys: {e}")
 
 
 def list_api_keys():
     """
     Lista todas as API keys no pool.
     """
-    db = SessionLocal()
-    
     try:
-        keys = db.query(models_batch.ApiKeyPool).all()
-        
-        logger.info("=" * 80)
-        logger.info(f"API KEYS NO POOL ({len(keys)} total)")
-        logger.info("=" * 80)
-        
-        for key in keys:
-            status = "✓ Ativo" if key.is_active else "✗ Inativo"
-            masked_key = key.api_key[:10] + "..." + key.api_key[-4:]
-            logger.info(f"\nID: {key.id}")
-            logger.info(f"  Service: {key.service}")
-            logger.info(f"  Owner: {key.owner_email}")
-            logger.info(f"  Key: {masked_key}")
-            logger.info(f"  Status: {status}")
-            logger.info(f"  Requests: {key.total_requests}")
-            logger.info(f"  Failed: {key.failed_requests}")
-            logger.info(f"  RPM Limit: {key.requests_per_minute}")
-        
-        logger.info("=" * 80)
+        with session_scope(CliSessionLocal) as db:
+            total = db.query(func.count(models_batch.ApiKeyPool.id)).scalar()
+            
+            # Relatório montado num buffer e emitido num único logger.info
+            buffer = io.StringIO()
+            buffer.write("=" * 80 + "\n")
+            buffer.write(f"API KEYS NO POOL ({total} total)\n")
+            buffer.write("=" * 80 + "\n")
+            
+            # Percorre o pool em lotes, sem manter todas as linhas em memória
+            keys = (
+                db.query(models_batch.ApiKeyPool)
+                .options(load_only(*API_KEY_LIST_COLUMNS))
+                .order_by(models_batch.ApiKeyPool.id)
+                .execution_options(stream_results=True)
+                .yield_per(API_KEY_LIST_BATCH_SIZE)
+            )
+            
+            for key in keys:
+                status = "✓ Ativo" if key.is_active else "✗ Inativo"
+                masked_key = key.api_key[:10] + "..." + key.api_key[-4:]
+                buffer.write(
+                    f"\nID: {key.id}\n"
+                    f"  Service: {key.service}\n"
+                    f"  Owner: {key.owner_email}\n"
+                    f"  Key: {masked_key}\n"
+                    f"  Status: {status}\n"
+                    f"  Requests: {key.total_requests}\n"
+                    f"  Failed: {key.failed_requests}\n"
+                    f"  RPM Limit: {key.requests_per_minute}\n"
+                )
+                db.expunge(key)
+            
+            buffer.write("=" * 80)
+            logger.info(buffer.getvalue())
         
     except Exception as e:
         logger.error(f"❌ Erro ao listar API keys: {e}")
-    finally:
-        db.close()
 
 
 def remove_api_key(key_id: int):
@@ -95,27 +160,21 @@ def remove_api_key(key_id: int):
     Args:
         key_id: ID da API key
     """
-    db = SessionLocal()
-    
     try:
-        key = db.query(models_batch.ApiKeyPool).filter(
-            models_batch.ApiKeyPool.id == key_id
-        ).first()
-        
-        if not key:
-            logger.error(f"API key com ID {key_id} não encontrada")
-            return
-        
-        db.delete(key)
-        db.commit()
+        with session_scope(CliSessionLocal) as db:
+            # DELETE direto, sem carregar a linha antes
+            deleted = db.query(models_batch.ApiKeyPool).filter(
+                models_batch.ApiKeyPool.id == key_id
+            ).delete(synchronize_session=False)
+            
+            if not deleted:
+                logger.error(f"API key com ID {key_id} não encontrada")
+                return
         
         logger.info(f"✅ API key removida (ID: {key_id})")
         
     except Exception as e:
         logger.error(f"❌ Erro ao remover API key: {e}")
-        db.rollback()
-    finally:
-        db.close()
 
 
 def toggle_api_key(key_id: int):
@@ -125,28 +184,26 @@ def toggle_api_key(key_id: int):
     Args:
         key_id: ID da API key
     """
-    db = SessionLocal()
-    
     try:
-        key = db.query(models_batch.ApiKeyPool).filter(
-            models_batch.ApiKeyPool.id == key_id
-        ).first()
-        
-        if not key:
-            logger.error(f"API key com ID {key_id} não encontrada")
-            return
-        
-        key.is_active = 1 if key.is_active == 0 else 0
-        db.commit()
-        
-        status = "ativada" if key.is_active else "desativada"
-        logger.info(f"✅ API key {status} (ID: {key_id})")
+        with session_scope(CliSessionLocal) as db:
+            # Inverte o status no próprio UPDATE (um round-trip)
+            updated = db.query(models_batch.ApiKeyPool).filter(
+                models_batch.ApiKeyPool.id == key_id
+            ).update(
+                {models_batch.ApiKeyPool.is_active: case(
+                    (models_batch.ApiKeyPool.is_active == 0, 1), else_=0
+                )},
+                synchronize_session=False
+            )
+            
+            if not updated:
+                logger.error(f"API key com ID {key_id} não encontrada")
+                return
+        
+        logger.info(f"✅ Status da API key alternado (ID: {key_id})")
         
     except Exception as e:
         logger.error(f"❌ Erro ao alterar status: {e}")
-        db.rollback()
-    finally:
-        db.close()
 
 
 if __name__ == "__main__":
@@ -162,6 +219,13 @@ if __name__ == "__main__":
     add_parser.add_argument("--key", required=True, help="API key")
     add_parser.add_argument("--rpm", type=int, default=60, help="Requisições por minuto (padrão: 60)")
     
+    # Comando: add-bulk
+    add_bulk_parser = subparsers.add_parser("add-bulk", help="Adicionar API keys de um CSV")
+    add_bulk_parser.add_argument(
+        "--file", required=True,
+        help="CSV com cabeçalho owner_email,service,api_key[,requests_per_minute]"
+    )
+    
     # Comando: list
     list_parser = subparsers.add_parser("list", help="Listar API keys")
     
@@ -177,6 +241,9 @@ if __name__ == "__main__":
     
     if args.command == "add":
         add_api_key(args.email, args.service, args.key, args.rpm)
+    elif args.command == "add-bulk":
+        with open(args.file, newline="", encoding="utf-8") as f:
+            add_api_keys_bulk(list(csv.DictReader(f)))
     elif args.command == "list":
         list_api_keys()
     elif args.command == "remove":
@@ -1,13 +1,35 @@
 #!/usr/bin/env python3
 # test_api.py - Teste completo da API BoredFy
 
+import sys
 import requests
-import json
+from requests.adapters import HTTPAdapter
+import orjson
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-BASE_URL = "http://localhost:8000"
+# Servidor real (modo --live); no modo padrão a app roda em processo
+LIVE_BASE_URL = "http://localhost:8000"
+BASE_URL = ""
 token = None
 
+# Cliente compartilhado pelos testes (definido em run_all_tests)
+session = None
+
+def create_live_session():
+    """Sessão HTTP com keep-alive para testar um servidor em execução"""
+    live_session = requests.Session()
+    live_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return live_session
+
+def parse(response):
+    """Corpo JSON da resposta decodificado com orjson"""
+    return orjson.loads(response.content)
+
+def pretty(data):
+    """JSON indentado para exibição"""
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+
 def print_section(title):
     print(f"\n{'='*60}")
     print(f"  {title}")
@@ -15,9 +37,9 @@ def print_section(title):
 
 def test_health():
     print_section("1. TESTE DE HEALTH CHECK")
-    response = requests.get(f"{BASE_URL}/health")
+    response = session.get(f"{BASE_URL}/health")
     print(f"Status: {response.status_code}")
-    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    print(f"Response: {pretty(parse(response))}")
     assert response.status_code == 200
     print("✅ Health check OK")
 
@@ -27,10 +49,10 @@ def test_register():
         "email": "teste@boredfy.com",
         "password": "senha123"
     }
-    response = requests.post(f"{BASE_URL}/auth/register", json=data)
+    response = session.post(f"{BASE_URL}/auth/register", json=data)
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
-        print(f"Response: {json.dumps(response.json(), indent=2)}")
+        print(f"Response: {pretty(parse(response))}")
         print("✅ Registro OK")
     elif response.status_code == 400:
         print("⚠️  Usuário já existe (OK)")
@@ -44,11 +66,12 @@ def test_login():
         "username": "teste@boredfy.com",
         "password": "senha123"
     }
-    response = requests.post(f"{BASE_URL}/auth/login", data=data)
+    response = session.post(f"{BASE_URL}/auth/login", data=data)
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
-        result = response.json()
+        result = parse(response)
         token = result["access_token"]
+        session.headers.update(get_headers())
         print(f"Token obtido: {token[:50]}...")
         print("✅ Login OK")
     else:
@@ -60,9 +83,9 @@ def get_headers():
 
 def test_me():
     print_section("4. TESTE DE /auth/me")
-    response = requests.get(f"{BASE_URL}/auth/me", headers=get_headers())
+    response = session.get(f"{BASE_URL}/auth/me")
     print(f"Status: {response.status_code}")
-    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    print(f"Response: {pretty(parse(response))}")
     assert response.status_code == 200
     print("✅ /auth/me OK")
 
@@ -70,19 +93,19 @@ def test_api_key_validation():
     print_section("5. TESTE DE VALIDAÇÃO DE API KEY")
     # Usar uma chave fake para teste
     data = {"api_key": "AIzaSyTest_FakeKey_ForTesting_1234567890"}
-    response = requests.post(f"{BASE_URL}/api-keys/validate", json=data, headers=get_headers())
+    response = session.post(f"{BASE_URL}/api-keys/validate", json=data)
     print(f"Status: {response.status_code}")
-    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    print(f"Response: {pretty(parse(response))}")
     print("⚠️  Chave fake (esperado falhar)")
 
 def test_get_voices():
     print_section("6. TESTE DE LISTAGEM DE VOZES")
-    response = requests.get(f"{BASE_URL}/voices", headers=get_headers())
+    response = session.get(f"{BASE_URL}/voices")
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
-        result = response.json()
+        result = parse(response)
         print(f"Total de vozes: {len(result['voices'])}")
-        print(f"Primeira voz: {json.dumps(result['voices'][0], indent=2)}")
+        print(f"Primeira voz: {pretty(result['voices'][0])}")
         print("✅ Listagem de vozes OK")
     else:
         print(f"❌ Erro: {response.text}")
@@ -102,10 +125,10 @@ def test_create_agent():
         "tts_voices": {},
         "visual_media_enabled": False
     }
-    response = requests.post(f"{BASE_URL}/agents", json=data, headers=get_headers())
+    response = session.post(f"{BASE_URL}/agents", json=data)
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
-        result = response.json()
+        result = parse(response)
         print(f"Agente criado: {result['name']} (ID: {result['id']})")
         print("✅ Criação de agente OK")
         return result['id']
@@ -115,10 +138,10 @@ def test_create_agent():
 
 def test_get_agents():
     print_section("8. TESTE DE LISTAGEM DE AGENTES")
-    response = requests.get(f"{BASE_URL}/agents", headers=get_headers())
+    response = session.get(f"{BASE_URL}/agents")
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
-        result = response.json()
+        result = parse(response)
         print(f"Total de agentes: {len(result)}")
         if result:
             print(f"Primeiro agente: {result[0]['name']}")
@@ -128,40 +151,99 @@ def test_get_agents():
 
 def test_get_stats():
     print_section("9. TESTE DE DASHBOARD DE STATS")
-    response = requests.get(f"{BASE_URL}/stats/dashboard", headers=get_headers())
+    response = session.get(f"{BASE_URL}/stats/dashboard")
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
-        result = response.json()
-        print(f"Stats: {json.dumps(result, indent=2)}")
+        result = parse(response)
+        print(f"Stats: {pretty(result)}")
         print("✅ Dashboard de stats OK")
     else:
         print(f"❌ Erro: {response.text}")
 
 def test_get_recent_files():
     print_section("10. TESTE DE ARQUIVOS RECENTES")
-    response = requests.get(f"{BASE_URL}/files/recent", headers=get_headers())
+    response = session.get(f"{BASE_URL}/files/recent")
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
-        result = response.json()
+        result = parse(response)
         print(f"Total de arquivos (24h): {len(result)}")
         print("✅ Listagem de arquivos OK")
     else:
         print(f"❌ Erro: {response.text}")
 
-def run_all_tests():
+def test_job_etag(agent_id):
+    print_section("11. TESTE DE ETAG DO JOB (304)")
+    response = session.post(f"{BASE_URL}/jobs/generate", json={"agent_id": agent_id, "titulos": ["Teste ETag"]})
+    assert response.status_code == 200, response.text
+    job_id = parse(response)[0]["id"]
+    
+    # Sem API key válida o job falha logo; esperar o estado final para que
+    # o ETag não mude entre as duas leituras
+    for _ in range(50):
+        response = session.get(f"{BASE_URL}/jobs/{job_id}")
+        assert response.status_code == 200, response.text
+        if parse(response)["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.2)
+    etag = response.headers.get("ETag")
+    assert etag, "Resposta sem ETag"
+    
+    response = session.get(f"{BASE_URL}/jobs/{job_id}", headers={"If-None-Match": etag})
+    print(f"Status com If-None-Match: {response.status_code}")
+    assert response.status_code == 304
+    assert not response.content
+    assert response.headers.get("ETag") == etag
+    
+    # ETag diferente (ou com include_result) devolve o corpo completo
+    response = session.get(f"{BASE_URL}/jobs/{job_id}", headers={"If-None-Match": 'W/"outro"'})
+    assert response.status_code == 200
+    response = session.get(f"{BASE_URL}/jobs/{job_id}?include_result=true", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    print("✅ ETag/304 do job OK")
+
+def run_all_tests(live: bool = False):
+    """
+    Executa os testes. Por padrão usa o TestClient (app ASGI em processo,
+    sem rede); com live=True chama o servidor em LIVE_BASE_URL.
+    """
+    global session, BASE_URL
+    
+    if live:
+        BASE_URL = LIVE_BASE_URL
+        session = create_live_session()
+        return _run_tests()
+    
+    from fastapi.testclient import TestClient
+    from main import app
+    
+    BASE_URL = ""
+    # Entrar no contexto executa o startup da app uma única vez
+    with TestClient(app) as client:
+        session = client
+        return _run_tests()
+
+def _run_tests():
     print("\n🚀 INICIANDO TESTES DA API BOREDFY\n")
     
     try:
         test_health()
         test_register()
         test_login()
-        test_me()
-        test_api_key_validation()
-        test_get_voices()
         agent_id = test_create_agent()
-        test_get_agents()
-        test_get_stats()
-        test_get_recent_files()
+        test_job_etag(agent_id)
+
+        # Testes somente-leitura são independentes: rodar em paralelo
+        parallel_tests = [
+            test_me,
+            test_get_voices,
+            test_get_agents,
+            test_get_stats,
+            test_get_recent_files,
+            test_api_key_validation,
+        ]
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            # list() propaga a primeira exceção (assert) dos testes
+            list(executor.map(lambda test: test(), parallel_tests))
         
         print_section("RESUMO DOS TESTES")
         print("✅ Todos os testes básicos passaram!")
@@ -177,4 +259,4 @@ def run_all_tests():
         traceback.print_exc()
 
 if __name__ == "__main__":
-    run_all_tests()
+    run_all_tests(live="--live" in sys.argv[1:])
@@ -2,15 +2,33 @@
 """
 Testes automatizados para o sistema de processamento em lote.
 """
+import os
 import sys
 import time
-import json
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+import orjson
 import logging
 from datetime import datetime
+from functools import lru_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _check(condition, message: str):
+    """Falha o teste com a mensagem dada (não é removido por python -O)."""
+    if not condition:
+        raise AssertionError(message)
+
+
+@lru_cache(maxsize=1)
+def _tables_snapshot() -> frozenset:
+    """Tabelas existentes no banco, consultadas uma vez por execução."""
+    from sqlalchemy import inspect
+    from database import engine
+    return frozenset(inspect(engine).get_table_names())
+
+
 # ============================================================================
 # TESTES UNITÁRIOS
 # ============================================================================
@@ -22,21 +40,23 @@ def test_voice_catalog():
     logger.info("=" * 80)
     
     try:
-        with open('tts_voices_catalog.json', 'r') as f:
-            catalog = json.load(f)
+        with open('tts_voices_catalog.json', 'rb') as f:
+            catalog = orjson.loads(f.read())
         
         # Verificações
-        assert len(catalog) > 0, "Catálogo vazio"
-        assert "pt-BR" in catalog, "pt-BR não encontrado"
-        assert "en-US" in catalog, "en-US não encontrado"
+        _check(len(catalog) > 0, "Catálogo vazio")
+        _check("pt-BR" in catalog, "pt-BR não encontrado")
+        _check("en-US" in catalog, "en-US não encontrado")
         
         total_voices = sum(len(voices) for voices in catalog.values())
         logger.info(f"✅ Catálogo válido: {len(catalog)} idiomas, {total_voices} vozes")
         
         # Verificar formato das vozes
         for lang, voices in catalog.items():
-            for voice in voices:
-                assert voice.startswith(lang), f"Voz {voice} não corresponde ao idioma {lang}"
+            prefix = f"{lang}-"
+            plen = len(prefix)
+            bad = [voice for voice in voices if voice[:plen] != prefix]
+            _check(not bad, f"Vozes {bad} não correspondem ao idioma {lang}")
         
         logger.info("✅ Formato das vozes correto")
         return True
@@ -54,12 +74,9 @@ def test_database_models():
     
     try:
         import models_batch
-        from sqlalchemy import inspect
-        from database import engine
         
         # Verificar se as tabelas existem
-        inspector = inspect(engine)
-        tables = inspector.get_table_names()
+        tables = _tables_snapshot()
         
         required_tables = ['batches', 'batch_jobs', 'api_key_pool']
         
@@ -70,16 +87,16 @@ def test_database_models():
                 logger.warning(f"⚠ Tabela '{table}' não existe (será criada na migração)")
         
         # Verificar campos dos modelos
-        batch_fields = [c.name for c in models_batch.Batch.__table__.columns]
-        assert 'id' in batch_fields, "Campo 'id' não encontrado em Batch"
-        assert 'mode' in batch_fields, "Campo 'mode' não encontrado em Batch"
-        assert 'status' in batch_fields, "Campo 'status' não encontrado em Batch"
+        batch_fields = frozenset(models_batch.Batch.__table__.columns.keys())
+        _check('id' in batch_fields, "Campo 'id' não encontrado em Batch")
+        _check('mode' in batch_fields, "Campo 'mode' não encontrado em Batch")
+        _check('status' in batch_fields, "Campo 'status' não encontrado em Batch")
         
         logger.info(f"✅ Modelo Batch válido ({len(batch_fields)} campos)")
         
-        job_fields = [c.name for c in models_batch.BatchJob.__table__.columns]
-        assert 'voice_id' in job_fields, "Campo 'voice_id' não encontrado em BatchJob"
-        assert 'language_code' in job_fields, "Campo 'language_code' não encontrado em BatchJob"
+        job_fields = frozenset(models_batch.BatchJob.__table__.columns.keys())
+        _check('voice_id' in job_fields, "Campo 'voice_id' não encontrado em BatchJob")
+        _check('language_code' in job_fields, "Campo 'language_code' não encontrado em BatchJob")
         
         logger.info(f"✅ Modelo BatchJob válido ({len(job_fields)} campos)")
         
@@ -104,7 +121,7 @@ def test_schemas():
             code="pt-BR",
             voice="pt-BR-Neural2-A"
         )
-        assert config.code == "pt-BR"
+        _check(config.code == "pt-BR", "Código de idioma incorreto")
         logger.info("✅ LanguageVoiceConfig válido")
         
         # Testar BatchCreateRequest
@@ -115,7 +132,7 @@ def test_schemas():
             language_voices=[config],
             num_variations=1
         )
-        assert request.mode == "expand_languages"
+        _check(request.mode == "expand_languages", "Modo do batch incorreto")
         logger.info("✅ BatchCreateRequest válido")
         
         # Testar validação de modo inválido
@@ -150,8 +167,8 @@ def test_cache_utils():
         key2 = cache_utils.generate_cache_key("test", title="Teste", lang="pt-BR")
         key3 = cache_utils.generate_cache_key("test", title="Outro", lang="pt-BR")
         
-        assert key1 == key2, "Cache keys iguais deveriam ser idênticas"
-        assert key1 != key3, "Cache keys diferentes deveriam ser distintas"
+        _check(key1 == key2, "Cache keys iguais deveriam ser idênticas")
+        _check(key1 != key3, "Cache keys diferentes deveriam ser distintas")
         logger.info("✅ Geração de cache key funcionando")
         
         # Testar rate limiter
@@ -159,10 +176,10 @@ def test_cache_utils():
         
         # Fazer 5 requisições (deve permitir todas)
         for i in range(5):
-            assert limiter.is_allowed("test_user"), f"Requisição {i+1} deveria ser permitida"
+            _check(limiter.is_allowed("test_user"), f"Requisição {i+1} deveria ser permitida")
         
         # 6ª requisição deve ser bloqueada
-        assert not limiter.is_allowed("test_user"), "6ª requisição deveria ser bloqueada"
+        _check(not limiter.is_allowed("test_user"), "6ª requisição deveria ser bloqueada")
         
         logger.info("✅ Rate limiter funcionando")
         
@@ -174,7 +191,7 @@ def test_cache_utils():
             breaker.record_failure("test_api")
         
         # Circuito deveria estar aberto
-        assert breaker.is_open("test_api"), "Circuit breaker deveria estar aberto"
+        _check(breaker.is_open("test_api"), "Circuit breaker deveria estar aberto")
         logger.info("✅ Circuit breaker funcionando")
         
         return True
@@ -196,13 +213,13 @@ def test_celery_tasks():
         from celery_app import celery_app
         
         # Verificar se task está registrada
-        assert 'celery_tasks.process_job_task' in celery_app.tasks, "Task process_job_task não registrada"
+        _check('celery_tasks.process_job_task' in celery_app.tasks, "Task process_job_task não registrada")
         logger.info("✅ Task process_job_task registrada")
         
         # Verificar funções auxiliares
-        assert hasattr(celery_tasks, 'generate_roteiro_gemini'), "Função generate_roteiro_gemini não encontrada"
-        assert hasattr(celery_tasks, 'adapt_roteiro_culturally'), "Função adapt_roteiro_culturally não encontrada"
-        assert hasattr(celery_tasks, 'generate_tts_audio'), "Função generate_tts_audio não encontrada"
+        _check(hasattr(celery_tasks, 'generate_roteiro_gemini'), "Função generate_roteiro_gemini não encontrada")
+        _check(hasattr(celery_tasks, 'adapt_roteiro_culturally'), "Função adapt_roteiro_culturally não encontrada")
+        _check(hasattr(celery_tasks, 'generate_tts_audio'), "Função generate_tts_audio não encontrada")
         
         logger.info("✅ Funções auxiliares presentes")
         
@@ -223,7 +240,7 @@ def test_batch_endpoints():
         import batch_endpoints
         
         # Verificar se router existe
-        assert hasattr(batch_endpoints, 'router'), "Router não encontrado"
+        _check(hasattr(batch_endpoints, 'router'), "Router não encontrado")
         logger.info("✅ Router definido")
         
         # Verificar rotas
@@ -239,8 +256,8 @@ def test_batch_endpoints():
                 logger.warning(f"⚠ Rota '{route}' não encontrada")
         
         # Verificar funções auxiliares
-        assert hasattr(batch_endpoints, 'validate_voice_for_language'), "Função validate_voice_for_language não encontrada"
-        assert hasattr(batch_endpoints, 'estimate_job_cost'), "Função estimate_job_cost não encontrada"
+        _check(hasattr(batch_endpoints, 'validate_voice_for_language'), "Função validate_voice_for_language não encontrada")
+        _check(hasattr(batch_endpoints, 'estimate_job_cost'), "Função estimate_job_cost não encontrada")
         
         logger.info("✅ Funções auxiliares presentes")
         
@@ -251,6 +268,215 @@ def test_batch_endpoints():
         return False
 
 
+def test_semantic_cache():
+    """Testa o cache semântico por similaridade de embeddings."""
+    logger.info("=" * 80)
+    logger.info("TESTE 8: Cache Semântico")
+    logger.info("=" * 80)
+    
+    try:
+        import cache_utils
+        
+        cache = cache_utils.SemanticCache(threshold=0.92, max_entries=2)
+        cache.add([1.0, 0.0, 0.0], "agente-a", "roteiro 1")
+        
+        # Vetor quase idêntico (título parafraseado) deve dar HIT
+        _check(cache.lookup([0.99, 0.05, 0.0], "agente-a") == "roteiro 1", "Deveria ser HIT")
+        
+        # Mesmo vetor com outro agente não pode reaproveitar o roteiro
+        _check(cache.lookup([1.0, 0.0, 0.0], "agente-b") is None, "Agente diferente deveria ser MISS")
+        
+        # Vetor ortogonal deve dar MISS
+        _check(cache.lookup([0.0, 1.0, 0.0], "agente-a") is None, "Vetor distante deveria ser MISS")
+        
+        # Limite de entradas remove a mais antiga
+        cache.add([0.0, 1.0, 0.0], "agente-a", "roteiro 2")
+        cache.add([0.0, 0.0, 1.0], "agente-a", "roteiro 3")
+        _check(cache.lookup([1.0, 0.0, 0.0], "agente-a") is None, "Entrada antiga deveria ter sido removida")
+        
+        logger.info("✅ Cache semântico funcionando")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Erro: {e}")
+        return False
+
+
+def test_file_cache():
+    """Testa o cache de arquivos endereçado por conteúdo."""
+    logger.info("=" * 80)
+    logger.info("TESTE 9: Cache de Arquivos")
+    logger.info("=" * 80)
+    
+    try:
+        import tempfile
+        import cache_utils
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = cache_utils.FileCache(os.path.join(tmp, "_cache"), max_files=1, suffix=".mp3")
+            key = cache.make_key("pt-BR-Neural2-A", "1.0", "0.0", "texto")
+            dest1 = os.path.join(tmp, "job1.mp3")
+            dest2 = os.path.join(tmp, "job2.mp3")
+            
+            _check(not cache.get(key, dest1), "Cache vazio deveria ser MISS")
+            
+            cache.put(key, b"audio", dest1)
+            _check(cache.get(key, dest2), "Mesma chave deveria ser HIT")
+            with open(dest2, "rb") as f:
+                _check(f.read() == b"audio", "Conteúdo materializado incorreto")
+            
+            # Limite de arquivos remove a entrada mais antiga
+            os.utime(cache._path(key), (0, 0))
+            cache.put(cache.make_key("outro"), b"audio 2", dest1)
+            _check(not cache.get(key, dest2), "Entrada antiga deveria ter sido removida")
+        
+        logger.info("✅ Cache de arquivos funcionando")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Erro: {e}")
+        return False
+
+
+def _mp3_frame_header(bitrate_index: int = 9, sample_rate_index: int = 0) -> bytes:
+    """Cabeçalho MPEG1 Layer III estéreo (padrão: 128 kbps, 44100 Hz)."""
+    return bytes([0xFF, 0xFB, (bitrate_index << 4) | (sample_rate_index << 2), 0x00])
+
+
+def test_mp3_duration():
+    """Testa a leitura da duração pelo cabeçalho MP3 e o fallback por texto."""
+    logger.info("=" * 80)
+    logger.info("TESTE 10: Duração de MP3")
+    logger.info("=" * 80)
+    
+    try:
+        import tempfile
+        import tts_utils
+        
+        # CBR 128 kbps: 16000 bytes = 1 s
+        cbr = _mp3_frame_header() + bytes(16000 - 4)
+        _check(abs(tts_utils.mp3_duration(cbr) - 1.0) < 1e-6, "Duração CBR incorreta")
+        
+        # Tag ID3v2 (tamanho syncsafe) antes do primeiro frame é ignorada
+        id3 = b"ID3" + bytes([4, 0, 0, 0, 0, 0, 1, 0]) + bytes(128)
+        with_tag = id3 + cbr
+        _check(abs(tts_utils.mp3_duration(with_tag) - 1.0) < 1e-6, "Tag ID3 não foi pulada")
+        
+        # Frame Xing (VBR): 100 frames de 1152 amostras a 44100 Hz
+        xing = _mp3_frame_header() + bytes(32) + b"Xing" + (1).to_bytes(4, "big") + (100).to_bytes(4, "big")
+        vbr = xing + bytes(4000)
+        _check(abs(tts_utils.mp3_duration(vbr) - 100 * 1152 / 44100) < 1e-6, "Duração VBR (Xing) incorreta")
+        
+        # Só o início do arquivo é lido; o tamanho total vem do disco
+        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
+            f.write(_mp3_frame_header() + bytes(32000 - 4))
+        try:
+            _check(abs(tts_utils.mp3_duration_from_file(f.name) - 2.0) < 1e-6, "Duração do arquivo incorreta")
+        finally:
+            os.unlink(f.name)
+        
+        # Sem cabeçalho MP3 (ex.: WAV): None e estimativa pelo texto
+        wav = b"RIFF" + bytes(4) + b"WAVEfmt " + bytes(4000)
+        _check(tts_utils.mp3_duration(wav) is None, "WAV não deveria ser reconhecido como MP3")
+        _check(tts_utils.mp3_duration(b"") is None, "Áudio vazio deveria retornar None")
+        text = "x" * (tts_utils.TTS_CHARS_PER_SECOND * 10)
+        _check(tts_utils.audio_duration_seconds(None, text) == 10, "Estimativa por texto incorreta")
+        _check(tts_utils.audio_duration_seconds(2.6, text) == 3, "Duração lida deveria ser arredondada")
+        
+        logger.info("✅ Duração de MP3 correta")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Erro: {e}")
+        return False
+
+
+def test_tts_chunks():
+    """Testa a divisão do texto em chunks dentro do limite de bytes do TTS."""
+    logger.info("=" * 80)
+    logger.info("TESTE 11: Chunks de TTS")
+    logger.info("=" * 80)
+    
+    try:
+        import tts_utils
+        
+        max_bytes = 60
+        text = (
+            "Olá, mundo! Ação e emoção em cada frase. "
+            "Uma frase bem longa que passa do limite de bytes e precisa ser quebrada por palavras. "
+            + "x" * 150 + " fim."
+        )
+        chunks = tts_utils.split_text_into_chunks(text, max_bytes=max_bytes)
+        
+        _check(len(chunks) > 1, "Texto longo deveria gerar vários chunks")
+        sizes = [len(chunk.encode("utf-8")) for chunk in chunks]
+        _check(max(sizes) <= max_bytes, f"Chunk acima do limite: {sizes}")
+        _check(all(chunk.strip() for chunk in chunks), "Chunk vazio gerado")
+        
+        # Nenhum caractere perdido, duplicado ou fora de ordem
+        _check(
+            "".join(chunks).replace(" ", "") == text.replace(" ", ""),
+            "Conteúdo dos chunks difere do texto original"
+        )
+        
+        # Texto curto fica em um único chunk; multibyte conta em bytes
+        _check(tts_utils.split_text_into_chunks("Frase curta.") == ["Frase curta."], "Texto curto alterado")
+        accented = tts_utils.split_text_into_chunks("ç" * 40, max_bytes=50)
+        _check(all(len(c.encode("utf-8")) <= 50 for c in accented), "Limite deve ser em bytes, não caracteres")
+        _check("".join(accented) == "ç" * 40, "Corte bruto perdeu caracteres")
+        
+        logger.info(f"✅ {len(chunks)} chunks, maior com {max(sizes)} bytes")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Erro: {e}")
+        return False
+
+
+def test_run_with_workers():
+    """Testa os workers com retry em erro de quota e resultados em ordem."""
+    logger.info("=" * 80)
+    logger.info("TESTE 12: Workers com Backoff")
+    logger.info("=" * 80)
+    
+    try:
+        import asyncio
+        from google.api_core import exceptions as google_exceptions
+        from main import run_with_workers
+        
+        attempts = {}
+        
+        async def work(item: int) -> int:
+            attempts[item] = attempts.get(item, 0) + 1
+            await asyncio.sleep(0.001 * (5 - item))  # termina fora de ordem
+            if item == 2 and attempts[item] == 1:
+                raise google_exceptions.ResourceExhausted("quota")
+            if item == 3:
+                raise ValueError("falha comum")
+            if item == 4:
+                raise google_exceptions.ResourceExhausted("quota")
+            return item * 10
+        
+        results = asyncio.run(run_with_workers(
+            [1, 2, 3, 4], work, num_workers=2, max_retries=3, backoff_seconds=0.001
+        ))
+        
+        _check(results[0] == 10 and results[1] == 20, f"Resultados fora de ordem: {results}")
+        _check(attempts[2] == 2, "Erro de quota deveria ser tentado de novo")
+        _check(isinstance(results[2], ValueError) and attempts[3] == 1, "Erro comum não deveria ter retry")
+        _check(
+            isinstance(results[3], google_exceptions.ResourceExhausted) and attempts[4] == 3,
+            "Quota persistente deveria parar em max_retries"
+        )
+        
+        logger.info("✅ Workers com backoff funcionando")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Erro: {e}")
+        return False
+
+
 # ============================================================================
 # TESTES DE INTEGRAÇÃO
 # ============================================================================
@@ -274,8 +500,8 @@ def test_estimate_cost():
         for num_jobs, expected_cost, expected_time in test_cases:
             result = batch_endpoints.estimate_job_cost(num_jobs)
             
-            assert result['total_jobs'] == num_jobs
-            assert abs(result['estimated_cost_usd'] - expected_cost) < 0.01
+            _check(result['total_jobs'] == num_jobs, f"Total de jobs incorreto para {num_jobs}")
+            _check(abs(result['estimated_cost_usd'] - expected_cost) < 0.01, f"Custo incorreto para {num_jobs} jobs")
             
             logger.info(f"✅ {num_jobs} jobs: ${result['estimated_cost_usd']}, {result['estimated_time_minutes']} min")
         
@@ -290,6 +516,17 @@ def test_estimate_cost():
 # RUNNER
 # ============================================================================
 
+def _run_one(spec) -> bool:
+    """Executa um teste num processo do pool (reimporta o módulo do teste)."""
+    name, module_name, func_name = spec
+    try:
+        test_func = getattr(importlib.import_module(module_name), func_name)
+        return bool(test_func())
+    except Exception as e:
+        logger.error(f"❌ Erro inesperado em '{name}': {e}")
+        return False
+
+
 def run_all_tests():
     """Executa todos os testes."""
     logger.info("\n")
@@ -306,19 +543,21 @@ def run_all_tests():
         ("Celery Tasks", test_celery_tasks),
         ("Endpoints de Batch", test_batch_endpoints),
         ("Estimativa de Custo", test_estimate_cost),
+        ("Cache Semântico", test_semantic_cache),
+        ("Cache de Arquivos", test_file_cache),
+        ("Duração de MP3", test_mp3_duration),
+        ("Chunks de TTS", test_tts_chunks),
+        ("Workers com Backoff", test_run_with_workers),
     ]
     
-    results = []
-    
-    for name, test_func in tests:
-        try:
-            result = test_func()
-            results.append((name, result))
-            logger.info("\n")
-        except Exception as e:
-            logger.error(f"❌ Erro inesperado em '{name}': {e}")
-            results.append((name, False))
-            logger.info("\n")
+    # Testes independentes: imports pesados rodam em paralelo nos workers
+    specs = [(name, test_func.__module__, test_func.__name__) for name, test_func in tests]
+    with ProcessPoolExecutor(max_workers=min(len(specs), os.cpu_count() or 1)) as executor:
+        results = list(zip(
+            (name for name, _ in tests),
+            executor.map(_run_one, specs)
+        ))
+    logger.info("\n")
     
     # Resumo
     logger.info("=" * 80)
@@ -0,0 +1,230 @@
+# tts_utils.py
+"""
+Utilitários compartilhados de TTS: divisão do texto em chunks e
+execução concorrente da síntese com retry.
+"""
+import os
+import re
+import asyncio
+import logging
+from typing import List, Callable, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Google Cloud TTS aceita no máximo 5000 bytes por requisição
+TTS_MAX_CHUNK_BYTES = 4500
+
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?…])\s+')
+
+# Estimativa de fala quando a duração não pode ser lida do MP3
+TTS_CHARS_PER_SECOND = 15
+
+# Cabeçalho MPEG Layer III (o formato devolvido pelo Google TTS)
+MP3_HEADER_SCAN_BYTES = 8192
+_MP3_BITRATES_KBPS = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),  # MPEG1
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),      # MPEG2
+    0: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),      # MPEG2.5
+}
+_MP3_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+
+
+def _byte_len(text: str) -> int:
+    return len(text.encode('utf-8'))
+
+
+def _split_oversized(sentence: str, max_bytes: int) -> List[str]:
+    """Quebra uma frase maior que o limite por palavras."""
+    parts = []
+    words = []
+    size = 0
+    for word in sentence.split():
+        word_len = _byte_len(word)
+        needed = word_len + 1 if words else word_len
+        if size + needed <= max_bytes:
+            words.append(word)
+            size += needed
+            continue
+        if words:
+            parts.append(" ".join(words))
+        # Palavra isolada maior que o limite: corte bruto
+        while word_len > max_bytes:
+            cut = max_bytes
+            while _byte_len(word[:cut]) > max_bytes:
+                cut -= 1
+            parts.append(word[:cut])
+            word = word[cut:]
+            word_len = _byte_len(word)
+        words = [word]
+        size = word_len
+    if words:
+        parts.append(" ".join(words))
+    return parts
+
+
+def split_text_into_chunks(text: str, max_bytes: int = TTS_MAX_CHUNK_BYTES) -> List[str]:
+    """
+    Divide o texto em chunks que respeitam o limite de bytes do TTS,
+    preferindo quebrar em fim de frase.
+
+    Args:
+        text: Texto completo
+        max_bytes: Tamanho máximo de cada chunk em bytes UTF-8
+
+    Returns:
+        Lista de chunks na ordem original
+    """
+    chunks = []
+    # Acumula as partes do chunk atual com o tamanho em bytes corrente,
+    # sem recodificar a string inteira a cada frase
+    parts = []
+    size = 0
+
+    for sentence in _SENTENCE_SPLIT_RE.split(text.strip()):
+        if not sentence:
+            continue
+        sentence_len = _byte_len(sentence)
+        pieces = [sentence] if sentence_len <= max_bytes else _split_oversized(sentence, max_bytes)
+        for piece in pieces:
+            piece_len = sentence_len if len(pieces) == 1 else _byte_len(piece)
+            needed = piece_len + 1 if parts else piece_len
+            if size + needed <= max_bytes:
+                parts.append(piece)
+                size += needed
+            else:
+                chunks.append(" ".join(parts))
+                parts = [piece]
+                size = piece_len
+
+    if parts:
+        chunks.append(" ".join(parts))
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, chunk in enumerate(chunks):
+            logger.debug("[TTS CHUNK %d] %d chars: %.100s...", i + 1, len(chunk), chunk)
+
+    return chunks
+
+
+async def run_tts(
+    chunks: List[str],
+    synth: Callable[[str], Awaitable[bytes]],
+    concurrency: int = 8,
+    max_retries: int = 3,
+    backoff_seconds: float = 1.0
+) -> bytes:
+    """
+    Sintetiza os chunks em paralelo e remonta o áudio na ordem original.
+
+    Args:
+        chunks: Lista de textos a sintetizar
+        synth: Corrotina do provedor que sintetiza um chunk e retorna bytes
+        concurrency: Máximo de chamadas simultâneas ao provedor
+        max_retries: Tentativas por chunk antes de desistir
+        backoff_seconds: Espera base entre tentativas (exponencial)
+
+    Returns:
+        Bytes do áudio concatenado
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def synth_with_retry(index: int, chunk: str) -> bytes:
+        for attempt in range(1, max_retries + 1):
+            try:
+                async with semaphore:
+                    return await synth(chunk)
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                wait = backoff_seconds * (2 ** (attempt - 1))
+                logger.warning(
+                    "[TTS CHUNK %d] Tentativa %d/%d falhou: %.100s (nova tentativa em %ss)",
+                    index + 1, attempt, max_retries, e, wait
+                )
+                await asyncio.sleep(wait)
+
+    results = await asyncio.gather(*[
+        synth_with_retry(i, chunk) for i, chunk in enumerate(chunks)
+    ])
+
+    audio = bytearray()
+    for part in results:
+        audio += part
+    return bytes(audio)
+
+
+def mp3_duration(data: bytes, total_size: Optional[int] = None) -> Optional[float]:
+    """
+    Calcula a duração de um MP3 a partir do cabeçalho do primeiro frame,
+    sem percorrer o arquivo (usa o frame Xing/Info quando presente).
+
+    Args:
+        data: Início do arquivo (ao menos os primeiros KB) ou o arquivo inteiro
+        total_size: Tamanho total do arquivo; padrão é len(data)
+
+    Returns:
+        Duração em segundos, ou None se não for um MP3 Layer III reconhecível
+    """
+    if total_size is None:
+        total_size = len(data)
+
+    offset = 0
+    # Pular tag ID3v2 (tamanho em "syncsafe integer")
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        offset = 10 + size
+
+    end = min(len(data), offset + MP3_HEADER_SCAN_BYTES) - 4
+    for pos in range(offset, end):
+        if data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+            continue
+
+        version = (data[pos + 1] >> 3) & 0x03
+        layer = (data[pos + 1] >> 1) & 0x03
+        bitrate_index = data[pos + 2] >> 4
+        sample_rate_index = (data[pos + 2] >> 2) & 0x03
+        if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+            continue
+
+        bitrate = _MP3_BITRATES_KBPS[version][bitrate_index] * 1000
+        sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+        samples_per_frame = 1152 if version == 3 else 576
+        mono = (data[pos + 3] >> 6) == 3
+
+        # Frame Xing/Info (VBR) traz o número total de frames
+        if version == 3:
+            side_info = 17 if mono else 32
+        else:
+            side_info = 9 if mono else 17
+        xing = pos + 4 + side_info
+        if data[xing:xing + 4] in (b"Xing", b"Info") and len(data) >= xing + 12:
+            flags = int.from_bytes(data[xing + 4:xing + 8], "big")
+            if flags & 0x01:
+                frames = int.from_bytes(data[xing + 8:xing + 12], "big")
+                return frames * samples_per_frame / sample_rate
+
+        # CBR: tamanho do áudio / bitrate
+        return (total_size - pos) * 8 / bitrate
+
+    return None
+
+
+def mp3_duration_from_file(path: str) -> Optional[float]:
+    """Duração de um arquivo MP3 lendo apenas o início dele."""
+    with open(path, "rb") as f:
+        head = f.read(MP3_HEADER_SCAN_BYTES * 2)
+    return mp3_duration(head, os.path.getsize(path))
+
+
+def audio_duration_seconds(duration: Optional[float], text: str) -> int:
+    """
+    Duração final do áudio em segundos inteiros: a lida do MP3 ou, sem
+    cabeçalho reconhecível, a estimativa por caracteres do texto.
+    """
+    if duration is not None:
+        return round(duration)
+    return len(text) // TTS_CHARS_PER_SECOND
@@ -1,9 +1,13 @@
 """
 Script para validar e listar todas as vozes disponíveis no Google Cloud TTS.
 """
-import json
+import hashlib
 from collections import defaultdict
 
+import orjson
+
+from voices_config import get_voice_type
+
 # Simulação das vozes disponíveis (baseado na documentação oficial do Google Cloud TTS)
 # Em produção, isso seria obtido via: client = texttospeech.TextToSpeechClient(); voices = client.list_voices()
 
@@ -114,25 +118,63 @@ GOOGLE_TTS_VOICES = {
     "sk-SK": ["sk-SK-Wavenet-A"],
 }
 
+# Totais do catálogo calculados uma vez na importação
+NUM_LANGUAGES = len(GOOGLE_TTS_VOICES)
+VOICES_BY_LANG_COUNT = {lang: len(voices) for lang, voices in GOOGLE_TTS_VOICES.items()}
+TOTAL_VOICES = sum(VOICES_BY_LANG_COUNT.values())
+
+VOICE_CATALOG_PATH = 'tts_voices_catalog.json'
+
+
+def write_voice_catalog(path: str = VOICE_CATALOG_PATH) -> bool:
+    """
+    Grava o catálogo em JSON apenas se o conteúdo mudou (compara o
+    SHA-256 do arquivo existente com o do conteúdo novo).
+    
+    Returns:
+        True se o arquivo foi (re)escrito
+    """
+    payload = orjson.dumps(GOOGLE_TTS_VOICES, option=orjson.OPT_INDENT_2)
+    digest = hashlib.sha256(payload).hexdigest()
+    
+    try:
+        with open(path, 'rb') as f:
+            if hashlib.sha256(f.read()).hexdigest() == digest:
+                return False
+    except FileNotFoundError:
+        pass
+    
+    with open(path, 'wb') as f:
+        f.write(payload)
+    return True
+
 def generate_voice_catalog():
     """Gera catálogo completo de vozes."""
-    total_voices = sum(len(voices) for voices in GOOGLE_TTS_VOICES.values())
-    
-    print(f"📊 Total de idiomas suportados: {len(GOOGLE_TTS_VOICES)}")
-    print(f"📊 Total de vozes disponíveis: {total_voices}")
-    print(f"📊 Média de vozes por idioma: {total_voices / len(GOOGLE_TTS_VOICES):.1f}")
+    print(f"📊 Total de idiomas suportados: {NUM_LANGUAGES}")
+    print(f"📊 Total de vozes disponíveis: {TOTAL_VOICES}")
+    print(f"📊 Média de vozes por idioma: {TOTAL_VOICES / NUM_LANGUAGES:.1f}")
     print()
     
-    # Salvar em JSON
-    with open('tts_voices_catalog.json', 'w', encoding='utf-8') as f:
-        json.dump(GOOGLE_TTS_VOICES, f, indent=2, ensure_ascii=False)
-    
-    print("✅ Catálogo salvo em: tts_voices_catalog.json")
+    # Salvar em JSON (sem reescrever se nada mudou)
+    if write_voice_catalog():
+        print(f"✅ Catálogo salvo em: {VOICE_CATALOG_PATH}")
+    else:
+        print(f"✅ Catálogo já atualizado: {VOICE_CATALOG_PATH}")
     
     # Estatísticas por idioma
     print("\n📋 Vozes por idioma:")
-    for lang, voices in sorted(GOOGLE_TTS_VOICES.items()):
-        print(f"  {lang}: {len(voices)} vozes")
+    for lang, count in sorted(VOICES_BY_LANG_COUNT.items()):
+        print(f"  {lang}: {count} vozes")
+    
+    # Estatísticas por tipo de voz
+    voices_by_type = defaultdict(int)
+    for voices in GOOGLE_TTS_VOICES.values():
+        for voice_id in voices:
+            voices_by_type[get_voice_type(voice_id)] += 1
+    
+    print("\n📋 Vozes por tipo:")
+    for voice_type, count in sorted(voices_by_type.items()):
+        print(f"  {voice_type}: {count} vozes")
     
     return GOOGLE_TTS_VOICES
 
@@ -1,59 +1,47 @@
 # voices_config.py - Configuração de 30 vozes premium para TTS
+import os
+import re
+import sys
+from types import MappingProxyType
+from dataclasses import dataclass
+from typing import Mapping, NamedTuple, Optional, Tuple
 
-PREMIUM_VOICES = [
-    # Português Brasileiro (5 vozes)
-    {"voice_id": "pt-BR-Neural2-A", "name": "Maria - Português Brasileiro (Feminino)", "language_code": "pt-BR", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "pt-BR-Neural2-B", "name": "João - Português Brasileiro (Masculino)", "language_code": "pt-BR", "gender": "male", "service": "GoogleTTS"},
-    {"voice_id": "pt-BR-Neural2-C", "name": "Ana - Português Brasileiro (Feminino)", "language_code": "pt-BR", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "pt-BR-Wavenet-A", "name": "Carla - Português Brasileiro (Feminino)", "language_code": "pt-BR", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "pt-BR-Wavenet-B", "name": "Pedro - Português Brasileiro (Masculino)", "language_code": "pt-BR", "gender": "male", "service": "GoogleTTS"},
-    
-    # Inglês Americano (5 vozes)
-    {"voice_id": "en-US-Neural2-A", "name": "Emma - American English (Female)", "language_code": "en-US", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "en-US-Neural2-D", "name": "James - American English (Male)", "language_code": "en-US", "gender": "male", "service": "GoogleTTS"},
-    {"voice_id": "en-US-Neural2-F", "name": "Sophia - American English (Female)", "language_code": "en-US", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "en-US-Wavenet-A", "name": "Olivia - American English (Female)", "language_code": "en-US", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "en-US-Wavenet-D", "name": "Michael - American English (Male)", "language_code": "en-US", "gender": "male", "service": "GoogleTTS"},
-    
-    # Espanhol (5 vozes)
-    {"voice_id": "es-ES-Neural2-A", "name": "Lucía - Español (Femenino)", "language_code": "es-ES", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "es-ES-Neural2-B", "name": "Carlos - Español (Masculino)", "language_code": "es-ES", "gender": "male", "service": "GoogleTTS"},
-    {"voice_id": "es-US-Neural2-A", "name": "Isabella - Español Americano (Femenino)", "language_code": "es-US", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "es-US-Neural2-B", "name": "Diego - Español Americano (Masculino)", "language_code": "es-US", "gender": "male", "service": "GoogleTTS"},
-    {"voice_id": "es-MX-Wavenet-A", "name": "Sofía - Español Mexicano (Femenino)", "language_code": "es-MX", "gender": "female", "service": "GoogleTTS"},
-    
-    # Francês (3 vozes)
-    {"voice_id": "fr-FR-Neural2-A", "name": "Amélie - Français (Féminin)", "language_code": "fr-FR", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "fr-FR-Neural2-B", "name": "Pierre - Français (Masculin)", "language_code": "fr-FR", "gender": "male", "service": "GoogleTTS"},
-    {"voice_id": "fr-FR-Wavenet-A", "name": "Chloé - Français (Féminin)", "language_code": "fr-FR", "gender": "female", "service": "GoogleTTS"},
-    
-    # Alemão (3 vozes)
-    {"voice_id": "de-DE-Neural2-A", "name": "Hannah - Deutsch (Weiblich)", "language_code": "de-DE", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "de-DE-Neural2-B", "name": "Lukas - Deutsch (Männlich)", "language_code": "de-DE", "gender": "male", "service": "GoogleTTS"},
-    {"voice_id": "de-DE-Wavenet-A", "name": "Emma - Deutsch (Weiblich)", "language_code": "de-DE", "gender": "female", "service": "GoogleTTS"},
-    
-    # Italiano (2 vozes)
-    {"voice_id": "it-IT-Neural2-A", "name": "Giulia - Italiano (Femminile)", "language_code": "it-IT", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "it-IT-Neural2-C", "name": "Marco - Italiano (Maschile)", "language_code": "it-IT", "gender": "male", "service": "GoogleTTS"},
-    
-    # Japonês (2 vozes)
-    {"voice_id": "ja-JP-Neural2-B", "name": "Sakura - 日本語 (女性)", "language_code": "ja-JP", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "ja-JP-Neural2-C", "name": "Takeshi - 日本語 (男性)", "language_code": "ja-JP", "gender": "male", "service": "GoogleTTS"},
-    
-    # Coreano (2 vozes)
-    {"voice_id": "ko-KR-Neural2-A", "name": "Ji-woo - 한국어 (여성)", "language_code": "ko-KR", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "ko-KR-Neural2-C", "name": "Min-jun - 한국어 (남성)", "language_code": "ko-KR", "gender": "male", "service": "GoogleTTS"},
-    
-    # Chinês Mandarim (2 vozes)
-    {"voice_id": "cmn-CN-Wavenet-A", "name": "Xiaomei - 中文 (女性)", "language_code": "cmn-CN", "gender": "female", "service": "GoogleTTS"},
-    {"voice_id": "cmn-CN-Wavenet-B", "name": "Xiaoyu - 中文 (男性)", "language_code": "cmn-CN", "gender": "male", "service": "GoogleTTS"},
+import orjson
+
+class Voice(NamedTuple):
+    """Voz do catálogo (registro imutável; _asdict() na fronteira JSON)"""
+    voice_id: str
+    name: str
+    language_code: str
+    gender: str
+    service: str
+
+# Catálogo de vozes premium (fonte única, também legível pelo frontend)
+VOICES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "voices.json")
+
+# Campos de vocabulário fixo: internados para compartilhar as strings e
+# acelerar comparações/buscas em dict por identidade
+_INTERNED_FIELDS = ("voice_id", "language_code", "gender", "service")
+
+def _build_premium_voices() -> Tuple[Voice, ...]:
+    """
+    Catálogo imutável: tupla de Voice, compartilhada sem cópias entre
+    requisições/threads (os índices apontam para os mesmos registros).
+    Lido de voices.json só no primeiro acesso (ver __getattr__ e _get_index).
+    """
+    with open(VOICES_FILE, "rb") as f:
+        voices = orjson.loads(f.read())
     
-    # Árabe (1 voz)
-    {"voice_id": "ar-XA-Wavenet-A", "name": "Fatima - العربية (أنثى)", "language_code": "ar-XA", "gender": "female", "service": "GoogleTTS"},
-]
+    return tuple(
+        Voice(**{
+            field: sys.intern(value) if field in _INTERNED_FIELDS else value
+            for field, value in voice.items()
+        })
+        for voice in voices
+    )
 
 # Mapeamento de idiomas suportados (100+ idiomas via detecção automática)
-SUPPORTED_LANGUAGES = {
+SUPPORTED_LANGUAGES = MappingProxyType({
     "pt-BR": "Português Brasileiro",
     "pt-PT": "Português Europeu",
     "en-US": "English (US)",
@@ -75,19 +63,144 @@ SUPPORTED_LANGUAGES = {
     "tr-TR": "Türkçe",
     "vi-VN": "Tiếng Việt",
     # ... (mais idiomas podem ser adicionados conforme necessário)
-}
+})
+
+# Códigos suportados (internados) para testes de pertinência; rótulos
+# continuam em SUPPORTED_LANGUAGES
+SUPPORTED_LANGUAGE_CODES = frozenset(sys.intern(code) for code in SUPPORTED_LANGUAGES)
+
+# Índices do catálogo (montados uma vez na importação; valores são tuplas)
+_EMPTY_VOICES = ()
+
+@dataclass(frozen=True)
+class _VoiceIndex:
+    by_id: Mapping[str, Voice]
+    by_language: Mapping[str, Tuple[Voice, ...]]
+    by_gender: Mapping[str, Tuple[Voice, ...]]
+    by_service: Mapping[str, Tuple[Voice, ...]]
+    by_language_gender: Mapping[Tuple[str, str], Tuple[Voice, ...]]
+
+def _build_index(voices: Tuple[Voice, ...]) -> _VoiceIndex:
+    """Monta todos os índices numa única passada pelo catálogo"""
+    by_id, by_language, by_gender, by_service, by_language_gender = {}, {}, {}, {}, {}
+    for voice in voices:
+        by_id[voice.voice_id] = voice
+        by_language.setdefault(voice.language_code, []).append(voice)
+        by_gender.setdefault(voice.gender, []).append(voice)
+        by_service.setdefault(voice.service, []).append(voice)
+        by_language_gender.setdefault((voice.language_code, voice.gender), []).append(voice)
+    
+    def freeze(groups):
+        return MappingProxyType({key: tuple(items) for key, items in groups.items()})
+    
+    return _VoiceIndex(
+        by_id=MappingProxyType(by_id),
+        by_language=freeze(by_language),
+        by_gender=freeze(by_gender),
+        by_service=freeze(by_service),
+        by_language_gender=freeze(by_language_gender),
+    )
+
+# Catálogo e índices carregados sob demanda: quem só usa SUPPORTED_LANGUAGES
+# ou get_voice_type não paga a montagem na importação
+_PREMIUM_VOICES: Optional[Tuple[Voice, ...]] = None
+_INDEX: Optional[_VoiceIndex] = None
+# Arrays JSON prontos por idioma (None = todas as vozes)
+_VOICES_JSON: Optional[Mapping[Optional[str], bytes]] = None
+
+def _get_premium_voices() -> Tuple[Voice, ...]:
+    global _PREMIUM_VOICES
+    if _PREMIUM_VOICES is None:
+        _PREMIUM_VOICES = _build_premium_voices()
+    return _PREMIUM_VOICES
+
+def _get_index() -> _VoiceIndex:
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = _build_index(_get_premium_voices())
+    return _INDEX
+
+def __getattr__(name: str):
+    """PEP 562: PREMIUM_VOICES é montado no primeiro acesso ao atributo"""
+    if name == "PREMIUM_VOICES":
+        return _get_premium_voices()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Tipo da voz extraído do voice_id em uma única busca
+_VOICE_TYPE_RE = re.compile(r'(Neural2|Wavenet|WaveNet|Chirp|Studio|Polyglot)')
+_VOICE_TYPE_LABELS = MappingProxyType({"Wavenet": "WaveNet", "Chirp": "Chirp 3 HD"})
+
+def get_voice_type(voice_id: str):
+    """Retorna o tipo da voz (Neural2, WaveNet, Studio...) a partir do ID"""
+    match = _VOICE_TYPE_RE.search(voice_id)
+    if not match:
+        return "Standard"
+    return _VOICE_TYPE_LABELS.get(match.group(1), match.group(1))
 
 def get_voices_by_language(language_code: str):
     """Retorna vozes disponíveis para um idioma específico"""
-    return [v for v in PREMIUM_VOICES if v["language_code"] == language_code]
+    return _get_index().by_language.get(language_code, _EMPTY_VOICES)
+
+def get_voice_count_by_language(language_code: str) -> int:
+    """Quantidade de vozes do idioma (tamanho da tupla já indexada)"""
+    return len(_get_index().by_language.get(language_code, _EMPTY_VOICES))
+
+def get_voice_count(
+    language_code: Optional[str] = None,
+    gender: Optional[str] = None,
+    service: Optional[str] = None
+) -> int:
+    """Quantidade de vozes para os filtros de get_voices (contadores da UI)"""
+    return len(get_voices(language_code, gender, service))
+
+def get_voices(
+    language_code: Optional[str] = None,
+    gender: Optional[str] = None,
+    service: Optional[str] = None
+):
+    """
+    Retorna as vozes que atendem aos filtros informados (None = qualquer),
+    partindo do índice mais específico disponível.
+    """
+    if language_code is not None and gender is not None:
+        voices = _get_index().by_language_gender.get((language_code, gender), _EMPTY_VOICES)
+    elif language_code is not None:
+        voices = _get_index().by_language.get(language_code, _EMPTY_VOICES)
+    elif gender is not None:
+        voices = _get_index().by_gender.get(gender, _EMPTY_VOICES)
+    else:
+        return _get_index().by_service.get(service, _EMPTY_VOICES) if service is not None else _get_premium_voices()
+    
+    if service is not None:
+        voices = tuple(v for v in voices if v.service == service)
+    return voices
 
 def get_all_voices():
     """Retorna todas as vozes premium"""
-    return PREMIUM_VOICES
+    return _get_premium_voices()
+
+def get_all_voices_json() -> bytes:
+    """Array JSON de todas as vozes (serializado uma vez e reaproveitado)"""
+    return _get_voices_json().get(None)
+
+def get_voices_by_language_json(language_code: str) -> bytes:
+    """Array JSON das vozes do idioma (b"[]" para idioma sem vozes)"""
+    return _get_voices_json().get(language_code, b"[]")
+
+def _get_voices_json() -> Mapping[Optional[str], bytes]:
+    global _VOICES_JSON
+    if _VOICES_JSON is None:
+        index = _get_index()
+        serialized = {None: _dumps_voices(_get_premium_voices())}
+        for language_code, voices in index.by_language.items():
+            serialized[language_code] = _dumps_voices(voices)
+        _VOICES_JSON = MappingProxyType(serialized)
+    return _VOICES_JSON
+
+def _dumps_voices(voices) -> bytes:
+    # Registros Voice (NamedTuple) viram objetos JSON
+    return orjson.dumps([voice._asdict() for voice in voices])
 
 def get_voice_by_id(voice_id: str):
     """Retorna uma voz específica pelo ID"""
-    for voice in PREMIUM_VOICES:
-        if voice["voice_id"] == voice_id:
-            return voice
-    return None
+    return _get_index().by_id.get(voice_id)